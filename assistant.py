@@ -1,15 +1,13 @@
 from openai import OpenAI
+from facts import COUNTRIES, extract_facts
 import json
 import os
-import re
 
 client = OpenAI()
 MEMORY_FILE = "memory.json"
 
-KNOWN_COUNTRIES = {
-    "italy", "france", "spain", "germany", "portugal",
-    "greece", "usa", "canada", "uk", "england", "australia"
-}
+# The CLI has no LLM extraction fallback, so only keep facts the local extractor is sure about.
+MIN_CONFIDENCE = 0.8
 
 SYSTEM_PROMPT = """
 You are Emily, a professional wedding planner with 10+ years of experience.
@@ -59,7 +57,7 @@ print("\n--- Emily · Wedding Assistant ---\n")
 name = memory["profile"].get("name")
 country = memory["wedding"].get("country")
 
-if country and country.lower() not in KNOWN_COUNTRIES:
+if country and country.lower() not in COUNTRIES:
     country = None
 
 if name and country:
@@ -74,14 +72,11 @@ conversation.append({"role": "assistant", "content": greeting})
 
 # ================= ENTITY EXTRACTION =================
 def extract_entities(text):
-    lower = text.lower().strip()
-
-    match = re.search(r"my name is ([a-zA-Z]+)", lower)
-    if match:
-        memory["profile"]["name"] = match.group(1).capitalize()
-
-    if lower in KNOWN_COUNTRIES:
-        memory["wedding"]["country"] = lower.capitalize()
+    result = extract_facts(text)
+    for section, values in result.facts.items():
+        memory[section].update({
+            key: value for key, value in values.items() if result.fields[key] >= MIN_CONFIDENCE
+        })
 
 # ================= MAIN LOOP =================
 while True:
@@ -0,0 +1,140 @@
+"""OpenAI-compatible /v1/chat/completions stand-in for offline benchmarks.
+
+Replies after a configurable latency, streams when asked, and answers
+extraction calls (json_object requests) with memory JSON that is
+occasionally malformed so the server's retry path gets exercised.
+
+    uvicorn bench.fake_openai:app --port 9101
+    LATENCY=1.2 JITTER=0.3 MALFORMED_RATE=0.05 uvicorn bench.fake_openai:app --port 9101
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+LATENCY = float(os.environ.get("LATENCY", "0.8"))
+JITTER = float(os.environ.get("JITTER", "0.2"))
+TTFT = float(os.environ.get("TTFT", "0.3"))
+CHUNK_DELAY = float(os.environ.get("CHUNK_DELAY", "0.02"))
+MALFORMED_RATE = float(os.environ.get("MALFORMED_RATE", "0.02"))
+
+REPLIES = [
+    "That sounds lovely — a spring date gives you soft light and mild evenings. Have you started thinking about the guest list?",
+    "Italy is a beautiful choice. Would you like something intimate by the lake or a bigger celebration in the countryside?",
+    "I don't have a budget stored for you yet. Whenever you're ready, we can sketch a range together.",
+    "A rustic style works wonderfully with long tables and candlelight. Shall we look at a few venues that fit it?",
+]
+
+EXTRACTIONS = [
+    {"profile": {"name": None, "partner": None}, "wedding": {"country": None, "city": None, "date": None,
+     "style": None, "guests_count": None, "budget_range": None, "venue_shortlist": []}},
+    {"profile": {"name": "Anna", "partner": "Marco"}, "wedding": {"country": "Italy", "city": None,
+     "date": None, "style": None, "guests_count": None, "budget_range": None, "venue_shortlist": []}},
+    {"profile": {"name": None, "partner": None}, "wedding": {"country": None, "city": "Florence",
+     "date": "2026-06-12", "style": "rustic", "guests_count": 120, "budget_range": "30-40k EUR",
+     "venue_shortlist": ["Villa Medici"]}},
+]
+
+app = FastAPI()
+calls = Counter()
+
+
+def delay() -> float:
+    return max(0.0, random.gauss(LATENCY, JITTER))
+
+
+def usage(messages) -> dict:
+    prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": 40,
+        "total_tokens": prompt_tokens + 40,
+        "prompt_tokens_details": {"cached_tokens": min(prompt_tokens, 1024) if prompt_tokens >= 1024 else 0},
+    }
+
+
+def completion(content: str, model: str, messages) -> dict:
+    return {
+        "id": f"chatcmpl-fake-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": usage(messages),
+    }
+
+
+def chunk(cid: str, model: str, delta: dict, finish=None, usage_=None) -> str:
+    body = {
+        "id": cid,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if usage_ is None else [],
+    }
+    if usage_ is not None:
+        body["usage"] = usage_
+    return f"data: {json.dumps(body)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-4o-mini")
+    messages = body.get("messages", [])
+    # The pre-async server sent extraction prompts without response_format.
+    is_extraction = (body.get("response_format") or {}).get("type") == "json_object" or any(
+        "Extract any facts" in (m.get("content") or "") for m in messages if m.get("role") == "system"
+    )
+
+    if is_extraction:
+        calls["extraction"] += 1
+        await asyncio.sleep(delay())
+        if random.random() < MALFORMED_RATE:
+            calls["malformed"] += 1
+            return completion('{"profile": {"name": "Anna", ', model, messages)
+        return completion(json.dumps(random.choice(EXTRACTIONS)), model, messages)
+
+    reply = random.choice(REPLIES)
+
+    if not body.get("stream"):
+        calls["reply"] += 1
+        await asyncio.sleep(delay())
+        return completion(reply, model, messages)
+
+    calls["stream"] += 1
+    include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+    async def events():
+        cid = f"chatcmpl-fake-{time.time_ns()}"
+        await asyncio.sleep(max(0.0, random.gauss(TTFT, JITTER / 2)))
+        yield chunk(cid, model, {"role": "assistant", "content": ""})
+        for word in reply.split(" "):
+            await asyncio.sleep(CHUNK_DELAY)
+            yield chunk(cid, model, {"content": word + " "})
+        yield chunk(cid, model, {}, finish="stop")
+        if include_usage:
+            yield chunk(cid, model, {}, usage_=usage(messages))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/_stats")
+async def stats():
+    return dict(calls)
+
+
+@app.post("/_reset")
+async def reset():
+    calls.clear()
+    return {"ok": True}
@@ -0,0 +1,64 @@
+"""In-memory PostgREST stand-in serving the emily_memories table.
+
+Supports exactly what server.py sends: `GET ?token=eq.<token>` and
+`?token=in.(...)` selects, and a bulk upsert `POST` with
+`Prefer: resolution=merge-duplicates`.
+
+    uvicorn bench.fake_supabase:app --port 9102
+"""
+import asyncio
+import os
+import random
+from collections import Counter
+from typing import Dict
+
+from fastapi import FastAPI, Request, Response
+
+LATENCY = float(os.environ.get("LATENCY", "0.04"))
+JITTER = float(os.environ.get("JITTER", "0.01"))
+
+app = FastAPI()
+rows: Dict[str, dict] = {}
+calls = Counter()
+
+
+async def wait():
+    await asyncio.sleep(max(0.0, random.gauss(LATENCY, JITTER)))
+
+
+@app.get("/rest/v1/emily_memories")
+async def select(request: Request):
+    calls["select"] += 1
+    await wait()
+    token = request.query_params.get("token", "")
+    if token.startswith("eq."):
+        tokens = [token[3:]]
+    elif token.startswith("in.(") and token.endswith(")"):
+        tokens = [t.strip().strip('"') for t in token[4:-1].split(",")]
+    else:
+        return []
+    return [{"token": t, "data": rows[t]} for t in tokens if t in rows]
+
+
+@app.post("/rest/v1/emily_memories")
+async def upsert(request: Request):
+    body = await request.json()
+    batch = body if isinstance(body, list) else [body]
+    calls["upsert"] += 1
+    calls["upserted_rows"] += len(batch)
+    await wait()
+    for row in batch:
+        rows[row["token"]] = row["data"]
+    return Response(status_code=201)
+
+
+@app.get("/_stats")
+async def stats():
+    return {**calls, "rows": len(rows)}
+
+
+@app.post("/_reset")
+async def reset():
+    calls.clear()
+    rows.clear()
+    return {"ok": True}
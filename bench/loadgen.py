@@ -0,0 +1,280 @@
+"""Replay realistic multi-turn /chat sessions against a running server.
+
+Each virtual user follows index_old.html: an empty-text greeting, then a
+few messages, all on the same token/page with a fresh cache-busting sid.
+Reports latency percentiles, throughput, server RSS over time and upstream
+calls per turn (read from the fake OpenAI/Supabase servers).
+
+Memory writes are write-behind, so upstream counters read right after the
+load miss the final upserts. With --stop-server the server is sent SIGTERM
+and the counters are read once it has exited, after its shutdown drain and
+flush. That also covers every worker, whereas /stats/extraction (used to
+wait for the queue before stopping) only reports the worker that answers.
+
+    python bench/loadgen.py --server http://127.0.0.1:9100 --pid 12345 \\
+        --sessions 400 --concurrency 100 --turns 4 --mode stream
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import statistics
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+
+PAGES = ["Entry", "Budget", "Venues", "Guests", "Timeline", "Style"]
+
+MESSAGES = [
+    "hi!",
+    "thanks, that helps",
+    "what should I do first?",
+    "My name is Anna and my fiancé is Marco.",
+    "We're getting married in Italy, probably Florence.",
+    "The date is June 12, 2026.",
+    "We expect around 120 guests.",
+    "Our budget is 30-40k euros.",
+    "We love a rustic style with lots of candles.",
+    "We're looking at Villa Medici and Castello di Vincigliata.",
+    "how do I pick a photographer?",
+    "ok sounds good",
+]
+
+
+# ---------- process stats ----------
+def process_tree(pid: int) -> List[int]:
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def rss_mb(pid: int) -> float:
+    total = 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return round(total / 1024, 1)
+
+
+def alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except (OSError, IndexError):
+        return False
+
+
+async def stop_server(pid: int, timeout: float) -> bool:
+    os.kill(pid, signal.SIGTERM)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if not alive(pid):
+            return True
+        await asyncio.sleep(0.1)
+    return False
+
+
+async def sample_rss(pid: int, interval: float, samples: list, stop: asyncio.Event):
+    start = time.perf_counter()
+    while not stop.is_set():
+        samples.append((round(time.perf_counter() - start, 1), rss_mb(pid)))
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+# ---------- upstream counters ----------
+async def upstream_stats(http: httpx.AsyncClient, url: Optional[str]) -> dict:
+    if not url:
+        return {}
+    try:
+        res = await http.get(f"{url.rstrip('/')}/_stats")
+        return res.json()
+    except httpx.HTTPError:
+        return {}
+
+
+async def wait_for_extraction(http: httpx.AsyncClient, server: str, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            stats = (await http.get(f"{server}/stats/extraction")).json()
+            if not stats.get("depth") and not stats.get("inflight"):
+                return
+        except (httpx.HTTPError, ValueError):
+            return
+        await asyncio.sleep(0.2)
+
+
+# ---------- sessions ----------
+async def turn(http: httpx.AsyncClient, server: str, mode: str, params: dict, text: str, results: list):
+    path = "/chat/stream" if mode == "stream" else "/chat"
+    start = time.perf_counter()
+    first = None
+    ok = False
+    try:
+        if mode == "stream":
+            async with http.stream("POST", f"{server}{path}", params=params, json={"text": text}) as res:
+                async for line in res.aiter_lines():
+                    if first is None and line.startswith("event: delta"):
+                        first = time.perf_counter() - start
+                    if line.startswith("event: done"):
+                        ok = True
+        else:
+            res = await http.post(f"{server}{path}", params=params, json={"text": text})
+            ok = res.status_code == 200
+    except httpx.HTTPError:
+        ok = False
+
+    results.append({
+        "latency": time.perf_counter() - start,
+        "ttft": first,
+        "ok": ok,
+        "greeting": not text,
+    })
+
+
+async def session(http, server, mode, turns, tokens, results, sem):
+    async with sem:
+        params = {
+            "token": random.choice(tokens),
+            "page": random.choice(PAGES),
+            "_": uuid.uuid4().hex[:12],
+        }
+        await turn(http, server, mode, params, "", results)
+        for _ in range(turns):
+            await asyncio.sleep(random.uniform(0.0, 0.2))
+            await turn(http, server, mode, params, random.choice(MESSAGES), results)
+
+
+# ---------- report ----------
+def percentiles(values: List[float]) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1)
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "mean_ms": round(statistics.mean(values) * 1000, 1)}
+
+
+def diff(after: dict, before: dict) -> dict:
+    return {k: v - before.get(k, 0) for k, v in after.items() if isinstance(v, (int, float))}
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as http:
+        openai_before = await upstream_stats(http, args.openai)
+        supabase_before = await upstream_stats(http, args.supabase)
+
+        rss_samples: list = []
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_rss(args.pid, args.rss_interval, rss_samples, stop)) if args.pid else None
+
+        tokens = [f"bench-{i}" for i in range(args.tokens)]
+        results: list = []
+        sem = asyncio.Semaphore(args.concurrency)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            session(http, args.server, args.mode, args.turns, tokens, results, sem)
+            for _ in range(args.sessions)
+        ))
+        elapsed = time.perf_counter() - start
+
+        await wait_for_extraction(http, args.server, args.drain_timeout)
+
+        if sampler:
+            stop.set()
+            await sampler
+            rss_samples.append((round(time.perf_counter() - start, 1), rss_mb(args.pid)))
+
+        stopped = None
+        if args.stop_server and args.pid:
+            stopped = await stop_server(args.pid, args.drain_timeout)
+        openai_calls = diff(await upstream_stats(http, args.openai), openai_before)
+        supabase_calls = diff(await upstream_stats(http, args.supabase), supabase_before)
+
+    chat_turns = [r for r in results if not r["greeting"]]
+    n_turns = max(1, len(chat_turns))
+    errors = sum(1 for r in results if not r["ok"])
+
+    return {
+        "mode": args.mode,
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "requests": len(results),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 2),
+        "rps": round(len(results) / elapsed, 1),
+        "latency": percentiles([r["latency"] for r in chat_turns if r["ok"]]),
+        "greeting_latency": percentiles([r["latency"] for r in results if r["greeting"] and r["ok"]]),
+        "ttft": percentiles([r["ttft"] for r in chat_turns if r["ttft"] is not None]),
+        "rss_mb": rss_samples,
+        "server_stopped": stopped,
+        "upstream": {
+            "openai": openai_calls,
+            "supabase": supabase_calls,
+            "openai_calls_per_turn": round(sum(openai_calls.get(k, 0) for k in ("reply", "stream", "extraction")) / n_turns, 3),
+            "supabase_calls_per_turn": round(sum(supabase_calls.get(k, 0) for k in ("select", "upsert")) / n_turns, 3),
+        },
+    }
+
+
+def parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--server", default="http://127.0.0.1:9100")
+    p.add_argument("--openai", default="http://127.0.0.1:9101", help="fake OpenAI base URL for call counters")
+    p.add_argument("--supabase", default="http://127.0.0.1:9102", help="fake Supabase base URL for call counters")
+    p.add_argument("--pid", type=int, help="server PID to sample RSS from (children included)")
+    p.add_argument("--mode", choices=["json", "stream"], default="json")
+    p.add_argument("--sessions", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=50)
+    p.add_argument("--turns", type=int, default=4, help="chat turns per session after the greeting")
+    p.add_argument("--tokens", type=int, default=100, help="distinct user tokens")
+    p.add_argument("--timeout", type=float, default=120)
+    p.add_argument("--drain-timeout", type=float, default=30)
+    p.add_argument("--rss-interval", type=float, default=1.0)
+    p.add_argument("--stop-server", action="store_true",
+                   help="SIGTERM --pid after the load and read upstream counters once it has flushed and exited")
+    p.add_argument("--out", help="write the JSON report here")
+    return p
+
+
+def main():
+    args = parser().parse_args()
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
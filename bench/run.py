@@ -0,0 +1,120 @@
+"""Start the fakes and server.py locally, replay a load profile, print the report.
+
+No real API keys or network access are used: the server is pointed at
+bench/fake_openai.py and bench/fake_supabase.py through OPENAI_BASE_URL and
+SUPABASE_URL. Extra arguments go to bench/loadgen.py.
+
+`--ref` serves server.py as of a git commit instead of the working tree, so
+the same load can be replayed against an older version (the pre-async
+baseline also needs supabase-py installed).
+
+    python bench/run.py --sessions 400 --concurrency 100 --mode stream --out baseline.json
+    python bench/run.py --workers 4 --llm-latency 1.5 --malformed-rate 0.05
+    python bench/run.py --ref baseline-sha --sessions 200 --concurrency 200 --out sync.json
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_ready(url: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def uvicorn(app: str, port: int, env: dict, workers: int = 1, cwd: str = ROOT) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"]
+    if workers > 1:
+        cmd += ["--workers", str(workers)]
+    return subprocess.Popen(cmd, cwd=cwd, env={**os.environ, **env})
+
+
+def checkout(ref: str, dest: str):
+    archive = subprocess.run(["git", "archive", ref], cwd=ROOT, check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", dest], input=archive, check=True)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--port", type=int, default=9100)
+    p.add_argument("--openai-port", type=int, default=9101)
+    p.add_argument("--supabase-port", type=int, default=9102)
+    p.add_argument("--workers", type=int, default=1, help="uvicorn workers for server.py")
+    p.add_argument("--ref", help="serve server.py from this git ref instead of the working tree")
+    p.add_argument("--llm-latency", type=float, default=0.8)
+    p.add_argument("--db-latency", type=float, default=0.04)
+    p.add_argument("--malformed-rate", type=float, default=0.02)
+    p.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                   help="extra environment for server.py, e.g. SESSION_MAX_ENTRIES=500")
+    args, loadgen_args = p.parse_known_args()
+
+    openai_url = f"http://127.0.0.1:{args.openai_port}"
+    supabase_url = f"http://127.0.0.1:{args.supabase_port}"
+    server_url = f"http://127.0.0.1:{args.port}"
+
+    server_env = {
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "OPENAI_API_KEY": "bench",
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_SERVICE_KEY": "bench",
+    }
+    server_env.update(kv.split("=", 1) for kv in args.server_env)
+
+    tree = tempfile.TemporaryDirectory(prefix="bench-") if args.ref else None
+    if tree:
+        checkout(args.ref, tree.name)
+
+    procs = [
+        uvicorn("bench.fake_openai:app", args.openai_port, {
+            "LATENCY": str(args.llm_latency),
+            "MALFORMED_RATE": str(args.malformed_rate),
+        }),
+        uvicorn("bench.fake_supabase:app", args.supabase_port, {"LATENCY": str(args.db_latency)}),
+    ]
+    try:
+        wait_ready(f"{openai_url}/_stats")
+        wait_ready(f"{supabase_url}/_stats")
+
+        server = uvicorn("server:app", args.port, server_env, workers=args.workers,
+                         cwd=tree.name if tree else ROOT)
+        procs.append(server)
+        wait_ready(f"{server_url}/")
+
+        cmd = [
+            sys.executable, os.path.join(ROOT, "bench", "loadgen.py"),
+            "--server", server_url,
+            "--openai", openai_url,
+            "--supabase", supabase_url,
+            "--pid", str(server.pid),
+            "--stop-server",
+            *loadgen_args,
+        ]
+        sys.exit(subprocess.call(cmd))
+    finally:
+        # Server first: its shutdown flush still needs the fake Supabase.
+        for proc in reversed(procs):
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if tree:
+            tree.cleanup()
+
+
+if __name__ == "__main__":
+    main()
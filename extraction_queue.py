@@ -0,0 +1,166 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+
+@dataclass
+class Turn:
+    text: str
+    reply: str
+    queued_at: float
+    # Facts already extracted locally; the handler merges these without an LLM call.
+    facts: Optional[dict] = None
+
+
+class ExtractionQueue:
+    """Background memory extraction, drained by a pool of asyncio workers.
+
+    Turns are grouped per token: everything that piles up for a token while
+    a worker is busy is handed to the handler as one batch, so a burst of
+    messages costs a single extraction call. A token is never processed by
+    two workers at once, which keeps merge/save ordered per user. Turns
+    carrying pre-extracted `facts` go through the same queue whenever the
+    token already has work pending, so they can't overtake it.
+
+    Everything runs on the event loop: `submit()` must be called from it and
+    the handler is a coroutine function. `rejected` counts turns refused
+    because the queue was full, `dropped` turns given up on after retries.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[str, List[Turn]], Awaitable[None]],
+        workers: int = 2,
+        max_retries: int = 2,
+        retry_delay: float = 1.0,
+        max_pending: int = 10000,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_pending = max_pending
+
+        self._pending: "OrderedDict[str, List[Turn]]" = OrderedDict()
+        self._active: Set[str] = set()
+        self._depth = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.calls = 0
+        self.processed = 0
+        self.retried = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+
+    # ---------- producer side ----------
+    def submit(self, token: str, text: str, reply: str, facts: Optional[dict] = None) -> bool:
+        if self._depth >= self.max_pending:
+            self.rejected += 1
+            return False
+
+        turn = Turn(text=text, reply=reply, queued_at=time.monotonic(), facts=facts)
+        turns = self._pending.get(token)
+        if turns is None:
+            self._pending[token] = [turn]
+        else:
+            turns.append(turn)
+            self.coalesced += 1
+        self._depth += 1
+        self.submitted += 1
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def busy(self, token: str) -> bool:
+        return token in self._pending or token in self._active
+
+    # ---------- consumer side ----------
+    def _take(self):
+        for token in self._pending:
+            if token not in self._active:
+                turns = self._pending.pop(token)
+                self._active.add(token)
+                self._depth -= len(turns)
+                return token, turns
+        return None
+
+    async def _worker(self):
+        while True:
+            job = self._take()
+            if job is None:
+                self._wakeup.clear()
+                job = self._take()
+                if job is None:
+                    await self._wakeup.wait()
+                    continue
+
+            token, turns = job
+            self.last_lag = time.monotonic() - turns[0].queued_at
+            try:
+                await self._run(token, turns)
+            finally:
+                self._active.discard(token)
+                if token in self._pending:
+                    self._wakeup.set()
+
+    async def _run(self, token: str, turns: List[Turn]):
+        for attempt in range(self.max_retries + 1):
+            self.calls += 1
+            try:
+                await self.handler(token, turns)
+                self.processed += len(turns)
+                return
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    self.dropped += len(turns)
+                    print("EXTRACTION DROPPED:", token, e)
+                    return
+                self.retried += 1
+                await asyncio.sleep(self.retry_delay * (2 ** attempt))
+
+    # ---------- lifecycle ----------
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self._pending:
+            self._wakeup.set()
+
+    async def stop(self, timeout: float = 5.0):
+        deadline = time.monotonic() + timeout
+        while (self._depth or self._active) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ---------- observability ----------
+    def stats(self) -> Dict[str, float]:
+        now = time.monotonic()
+        oldest = min((turns[0].queued_at for turns in self._pending.values()), default=now)
+        depth = self._depth
+        tokens = len(self._pending)
+        inflight = len(self._active)
+
+        return {
+            "depth": depth,
+            "pending_tokens": tokens,
+            "inflight": inflight,
+            "lag_seconds": round(now - oldest, 3),
+            "last_lag_seconds": round(self.last_lag, 3),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "calls": self.calls,
+            "processed": self.processed,
+            "retried": self.retried,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+        }
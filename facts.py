@@ -0,0 +1,565 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# ================= GAZETTEERS =================
+# alias (lowercase) -> canonical name
+COUNTRIES: Dict[str, str] = {
+    "italy": "Italy", "france": "France", "spain": "Spain", "germany": "Germany",
+    "portugal": "Portugal", "greece": "Greece", "croatia": "Croatia", "austria": "Austria",
+    "switzerland": "Switzerland", "netherlands": "Netherlands", "holland": "Netherlands",
+    "belgium": "Belgium", "ireland": "Ireland", "scotland": "Scotland", "wales": "Wales",
+    "england": "England", "uk": "UK", "united kingdom": "UK", "iceland": "Iceland",
+    "norway": "Norway", "sweden": "Sweden", "denmark": "Denmark", "finland": "Finland",
+    "poland": "Poland", "czech republic": "Czech Republic", "czechia": "Czech Republic",
+    "hungary": "Hungary", "malta": "Malta", "cyprus": "Cyprus", "turkey": "Turkey",
+    "morocco": "Morocco", "egypt": "Egypt", "south africa": "South Africa", "kenya": "Kenya",
+    "usa": "USA", "us": "USA", "united states": "USA", "america": "USA", "canada": "Canada",
+    "mexico": "Mexico", "costa rica": "Costa Rica", "brazil": "Brazil", "argentina": "Argentina",
+    "colombia": "Colombia", "peru": "Peru", "jamaica": "Jamaica", "bahamas": "Bahamas",
+    "dominican republic": "Dominican Republic", "australia": "Australia",
+    "new zealand": "New Zealand", "japan": "Japan", "thailand": "Thailand", "bali": "Indonesia",
+    "indonesia": "Indonesia", "india": "India", "sri lanka": "Sri Lanka", "maldives": "Maldives",
+    "mauritius": "Mauritius", "seychelles": "Seychelles", "vietnam": "Vietnam",
+    "uae": "UAE", "united arab emirates": "UAE",
+}
+
+CITIES: Dict[str, str] = {
+    "rome": "Rome", "florence": "Florence", "venice": "Venice", "milan": "Milan",
+    "naples": "Naples", "amalfi": "Amalfi", "positano": "Positano", "ravello": "Ravello",
+    "sorrento": "Sorrento", "capri": "Capri", "como": "Como", "lake como": "Lake Como",
+    "siena": "Siena", "verona": "Verona", "taormina": "Taormina", "palermo": "Palermo",
+    "paris": "Paris", "nice": "Nice", "cannes": "Cannes", "bordeaux": "Bordeaux",
+    "lyon": "Lyon", "marseille": "Marseille", "provence": "Provence",
+    "barcelona": "Barcelona", "madrid": "Madrid", "seville": "Seville", "ibiza": "Ibiza",
+    "mallorca": "Mallorca", "majorca": "Mallorca", "marbella": "Marbella", "malaga": "Malaga",
+    "lisbon": "Lisbon", "porto": "Porto", "sintra": "Sintra", "algarve": "Algarve",
+    "athens": "Athens", "santorini": "Santorini", "mykonos": "Mykonos", "crete": "Crete",
+    "dubrovnik": "Dubrovnik", "split": "Split", "hvar": "Hvar", "vienna": "Vienna",
+    "salzburg": "Salzburg", "zurich": "Zurich", "geneva": "Geneva", "lucerne": "Lucerne",
+    "amsterdam": "Amsterdam", "brussels": "Brussels", "bruges": "Bruges", "berlin": "Berlin",
+    "munich": "Munich", "prague": "Prague", "budapest": "Budapest", "copenhagen": "Copenhagen",
+    "stockholm": "Stockholm", "reykjavik": "Reykjavik", "dublin": "Dublin",
+    "edinburgh": "Edinburgh", "london": "London", "bath": "Bath", "cotswolds": "Cotswolds",
+    "new york": "New York", "nyc": "New York", "los angeles": "Los Angeles",
+    "san francisco": "San Francisco", "napa": "Napa", "chicago": "Chicago", "miami": "Miami",
+    "las vegas": "Las Vegas", "new orleans": "New Orleans", "charleston": "Charleston",
+    "savannah": "Savannah", "austin": "Austin", "nashville": "Nashville", "boston": "Boston",
+    "seattle": "Seattle", "toronto": "Toronto", "vancouver": "Vancouver", "montreal": "Montreal",
+    "cancun": "Cancun", "tulum": "Tulum", "cabo": "Cabo San Lucas", "marrakech": "Marrakech",
+    "cape town": "Cape Town", "sydney": "Sydney", "melbourne": "Melbourne",
+    "queenstown": "Queenstown", "tokyo": "Tokyo", "kyoto": "Kyoto", "phuket": "Phuket",
+    "dubai": "Dubai", "istanbul": "Istanbul",
+}
+
+STYLES = {
+    "rustic", "boho", "bohemian", "classic", "modern", "minimalist", "vintage", "glamorous",
+    "glam", "romantic", "elegant", "beach", "garden", "industrial", "traditional", "whimsical",
+    "fairytale", "black-tie", "black tie", "art deco", "tropical", "woodland", "barn",
+    "country", "mediterranean", "coastal", "intimate", "luxury", "chic", "timeless",
+}
+
+VENUE_WORDS = (
+    "Villa|Castello|Castle|Chateau|Château|Hotel|Palazzo|Masseria|Estate|Manor|Abbey|"
+    "Borgo|Finca|Hacienda|Tenuta|Quinta|Resort|Winery|Vineyard|Farm|Barn|Hall|Gardens|"
+    "Lodge|Inn|Chapel|Cathedral|Church|Mansion|House"
+)
+
+MONTHS = {
+    "january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3, "april": 4,
+    "apr": 4, "may": 5, "june": 6, "jun": 6, "july": 7, "jul": 7, "august": 8, "aug": 8,
+    "september": 9, "sep": 9, "sept": 9, "october": 10, "oct": 10, "november": 11,
+    "nov": 11, "december": 12, "dec": 12,
+}
+MONTH_NAMES = [None, "January", "February", "March", "April", "May", "June", "July",
+               "August", "September", "October", "November", "December"]
+
+# Names that are never the user's: the assistant and common "I'm <adjective>" words.
+NOT_NAMES = {
+    "emily", "assistant", "so", "very", "really", "just", "not", "getting", "going", "looking",
+    "happy", "excited", "thinking", "planning", "married", "engaged", "sure", "fine", "good",
+    "here", "ready", "new", "back", "sorry", "tired", "stressed", "interested", "hoping",
+    "still", "also", "a", "an", "the", "from", "in", "on", "at", "with", "trying", "okay", "ok",
+}
+
+# Nationalities, religions and adjectives that follow "I'm"/"this is" but are never names.
+NOT_NAME_WORDS = {
+    "italian", "french", "spanish", "german", "portuguese", "greek", "croatian", "austrian",
+    "swiss", "dutch", "belgian", "irish", "scottish", "welsh", "english", "british", "icelandic",
+    "norwegian", "swedish", "danish", "finnish", "polish", "czech", "hungarian", "maltese",
+    "cypriot", "turkish", "moroccan", "egyptian", "kenyan", "american", "canadian", "mexican",
+    "brazilian", "argentinian", "argentine", "colombian", "peruvian", "jamaican", "australian",
+    "japanese", "thai", "indonesian", "indian", "vietnamese", "chinese", "korean", "filipino",
+    "russian", "ukrainian", "romanian", "lebanese", "nigerian", "european", "asian", "african",
+    "latina", "latino", "catholic", "protestant", "jewish", "muslim", "hindu", "buddhist",
+    "orthodox", "atheist", "agnostic", "mormon", "sikh", "lutheran", "baptist", "anglican",
+    "amazing", "awesome", "great", "perfect", "beautiful", "wonderful", "lovely", "fantastic",
+    "gorgeous", "incredible", "crazy", "insane", "exciting", "overwhelming", "overwhelmed",
+    "confused", "nervous", "thrilled", "vegan", "vegetarian", "pregnant", "single", "divorced",
+    "retired", "busy", "done", "it", "what", "why", "how", "where", "when", "who",
+}
+
+NUMBER_WORDS = {
+    "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+    "a hundred": 100, "one hundred": 100, "two hundred": 200, "three hundred": 300,
+    "twenty": 20, "thirty": 30, "forty": 40, "a dozen": 12, "ten": 10, "fifteen": 15,
+}
+
+
+# ================= PATTERNS =================
+def _alternation(words) -> str:
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+NAME = r"([A-Z][a-zà-ÿ'’-]+)"
+# After an explicit "my name is" the casing doesn't matter ("my name is anna").
+ANY_CASE_NAME = r"([A-Za-zÀ-ÿ][A-Za-zÀ-ÿ'’-]+)"
+MONTH = _alternation(MONTHS)
+
+GREETING = r"(?i:hi|hello|hey|hiya|good (?:morning|afternoon|evening))(?:\s+(?i:there|emily))?[\s,!.—-]*"
+
+NAME_PATTERNS: List[Tuple[re.Pattern, float]] = [
+    (re.compile(r"\b(?i:my name(?:['’]s| is))\s+" + ANY_CASE_NAME), 0.95),
+    (re.compile(r"\b(?i:call me)\s+" + NAME), 0.8),
+    # "Hi, I'm Jane." / "Hello, this is Jane" — an introduction.
+    (re.compile(r"^\s*" + GREETING + r"(?:I['’]m|I am|(?i:this is))\s+" + NAME + r"\b"), 0.85),
+    # Without a greeting "I'm X" / "this is X" is as often an adjective as a
+    # name ("I'm Italian", "This is Amazing"); leave those to the LLM.
+    (re.compile(r"\b(?:I['’]m|I am|(?i:this is))\s+" + NAME + r"\b(?!\s+(?:and|&)\s)"), 0.5),
+]
+
+PARTNER_ROLE = (
+    r"(?:fianc[eé]e?|partner|husband(?:-to-be)?|wife(?:-to-be)?|future (?:husband|wife|spouse)|"
+    r"boyfriend|girlfriend|bride(?:-to-be)?|groom(?:-to-be)?)"
+)
+PARTNER_PATTERNS: List[Tuple[re.Pattern, float]] = [
+    (re.compile(r"\b(?i:my " + PARTNER_ROLE + r")(?:['’]s name)?(?: is|,)?\s+" + NAME), 0.9),
+    (re.compile(r"\b(?i:marrying|engaged to|getting married to)\s+" + NAME), 0.85),
+    (re.compile(r"\b" + NAME + r"\s+(?:and|&)\s+(?i:I|me)\b"), 0.6),
+    (re.compile(r"\b(?i:I|me)\s+(?:and|&)\s+" + NAME + r"\b"), 0.6),
+]
+
+COUNTRY_RE = re.compile(r"\b(" + _alternation(COUNTRIES) + r")\b", re.IGNORECASE)
+CITY_RE = re.compile(r"\b(" + _alternation(CITIES) + r")\b", re.IGNORECASE)
+PLACE_CONTEXT_RE = re.compile(r"\b(?:in|to|at|near|around|outside|married in|wedding in)\s*$", re.IGNORECASE)
+# "in Paris" is only the wedding's city when the sentence is about the wedding.
+WEDDING_CONTEXT_RE = re.compile(
+    r"\b(?:wedding|marry|marrying|married|ceremony|reception|elope|eloping|venue|celebration|"
+    r"i do|tie the knot|destination)\b",
+    re.IGNORECASE,
+)
+SENTENCE_RE = re.compile(r"[^.!?;\n]+")
+ORIGIN_CONTEXT_RE = re.compile(r"\b(?:from|live in|living in|based in|born in|grew up in)\s*$", re.IGNORECASE)
+
+DATE_PATTERNS = [
+    # June 12, 2026 / June 12th 2026
+    (re.compile(r"\b(" + MONTH + r")\.?\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})\b", re.IGNORECASE), "mdy"),
+    # 12 June 2026 / 12th of June, 2026
+    (re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?(" + MONTH + r")\.?,?\s+(\d{4})\b", re.IGNORECASE), "dmy"),
+    # 2026-06-12
+    (re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b"), "iso"),
+    # 12/06/2026 or 06/12/2026 (ambiguous unless one part is > 12)
+    (re.compile(r"\b(\d{1,2})[/.](\d{1,2})[/.](\d{4})\b"), "numeric"),
+    # June 2026
+    (re.compile(r"\b(" + MONTH + r")\.?,?\s+(\d{4})\b", re.IGNORECASE), "my"),
+]
+YEAR_RE = re.compile(r"\b(?:in|for|during)\s+(20[2-4]\d)\b", re.IGNORECASE)
+
+GUESTS_RE = re.compile(
+    r"\b(?:about|around|roughly|approximately|maybe|~)?\s*(\d{1,4}|" + _alternation(NUMBER_WORDS) + r")\s*\+?\s*"
+    r"(?:guests|people|attendees|invitees|persons)\b",
+    re.IGNORECASE,
+)
+# "people" is only a guest count next to guest-list words ("we had 300 people at my sister's wedding" is not).
+GUEST_CONTEXT_RE = re.compile(r"\b(?:invit\w*|guests?|expect\w*|headcount|attend\w*|rsvp)\b", re.IGNORECASE)
+NUMBER_RE = re.compile(r"\b(?:\d[\d,.]*|" + _alternation(NUMBER_WORDS) + r")\b", re.IGNORECASE)
+GUEST_LIST_RE = re.compile(r"\bguest (?:list|count) (?:of|is|around|about)\s+(\d{1,4})\b", re.IGNORECASE)
+
+AMOUNT = r"[$€£]?\s?\d[\d,.]*(?:\s?(?:k|thousand|mn|million|m)\b)?"
+BUDGET_RE = re.compile(
+    r"\bbudget\s+(?:is|of|around|about|at|will be|is about|is around|roughly)?\s*"
+    r"(?:about|around|roughly|up to|under|max|maximum)?\s*"
+    r"(" + AMOUNT + r")(?:\s*(?:-|–|to)\s*(" + AMOUNT + r"))?"
+    r"\s*(usd|eur|euros?|dollars?|pounds?|gbp|chf)?",
+    re.IGNORECASE,
+)
+SPEND_RE = re.compile(
+    r"\b(?:spend|spending)\s+(?:about|around|up to|roughly)?\s*(" + AMOUNT + r")(?:\s*(?:-|–|to)\s*(" + AMOUNT + r"))?"
+    r"\s*(usd|eur|euros?|dollars?|pounds?|gbp|chf)?",
+    re.IGNORECASE,
+)
+
+STYLE_RE = re.compile(r"\b(" + _alternation(STYLES) + r")\b", re.IGNORECASE)
+STYLE_CONTEXT_RE = re.compile(
+    r"\b(?:style|theme|vibe|aesthetic|feel|look|wedding|ceremony|celebration|affair)\b", re.IGNORECASE
+)
+
+PARTICLES = {"di", "de", "del", "della", "delle", "dei", "du", "des", "la", "le", "el", "of", "the",
+             "da", "do", "dos", "das", "on", "upon"}
+VENUE_KEYWORDS = set(VENUE_WORDS.split("|"))
+# Capitalized words that start a clause but never a venue name.
+NOT_VENUE_WORDS = {
+    "i", "i'm", "i’m", "we", "we're", "we’re", "we've", "we’ve", "we'd", "our", "my", "us", "you",
+    "it", "it's", "they", "he", "she", "hi", "hello", "hey", "yes", "no", "maybe", "so", "also",
+    "just", "at", "in", "to", "from", "visiting", "toured", "booked", "looking", "considering",
+    "love", "like", "what", "how", "is", "are", "and", "or", "but", "then",
+}
+CLAUSE_SPLIT_RE = re.compile(r"\s*(?:[,;&]|\band\b|\bor\b)\s*", re.IGNORECASE)
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+VENUE_CONTEXT_RE = re.compile(
+    r"\b(?:venue|venues|looking at|shortlist|booked|visiting|considering|toured|love|like|at)\b", re.IGNORECASE
+)
+
+# Words that suggest a fact is being stated, per field (or group of fields
+# that resolve the cue). A cue without a matching extracted field means the
+# patterns missed something and the LLM should look.
+FIELD_CUES: List[Tuple[Tuple[str, ...], re.Pattern]] = [
+    # "I'm <Capitalized>" may be a name the patterns couldn't confirm.
+    (("name",), re.compile(r"\b(?i:my name|call me|I['’]?m called)\b|\b(?:I['’]m|I am)\s+[A-Z]")),
+    (("partner",), re.compile(
+        r"\b(?:fianc[eé]e?|partner|husband|wife|boyfriend|girlfriend|marrying|engaged to)\b", re.IGNORECASE)),
+    (("country", "city"), re.compile(
+        r"\b(?:married in|marrying in|wedding in|ceremony in|getting married (?:in|at|on)|destination wedding|"
+        r"elope to)\b", re.IGNORECASE)),
+    (("date",), re.compile(
+        r"\b(?:" + MONTH + r"|wedding date|the date|20[2-4]\d|next (?:spring|summer|autumn|fall|winter|year))\b",
+        re.IGNORECASE)),
+    (("guests_count",), re.compile(r"\b(?:guests?|invit(?:e|ing)|headcount)\b", re.IGNORECASE)),
+    (("budget_range",), re.compile(r"\b(?:budget|spend|spending|afford)\b", re.IGNORECASE)),
+    (("style",), re.compile(r"\b(?:style|theme|vibe|aesthetic)\b", re.IGNORECASE)),
+    (("venue_shortlist",), re.compile(
+        r"\b(?:venues?|villa|castle|chateau|château|estate|palazzo|shortlist|booked)\b", re.IGNORECASE)),
+]
+SMALL_TALK_RE = re.compile(
+    r"^\s*(?:(?:hi|hello|hey|thanks|thank you|thx|ok|okay|sure|great|cool|nice|lovely|perfect|yes|yeah|yep|"
+    r"no|nope|sounds good|got it|bye|good (?:morning|afternoon|evening)|hmm+|idk|not sure|no idea|"
+    r"i don['’]?t know|maybe|lol|haha|that helps|that['’]?s (?:great|helpful|perfect))\b[\s!.,?]*)+",
+    re.IGNORECASE,
+)
+# Emily asks one question at a time, so replies like "Marco" or "about 120"
+# carry a fact that only makes sense next to her question.
+SHORT_ANSWER_WORDS = 4
+# Statements that resolve no field but talk about the wedding, the user, or a
+# quantity ("small ceremony with just family in Tuscany", "around fifty")
+# still go to the LLM; only small talk and plain questions are skipped.
+FIRST_PERSON_RE = re.compile(r"\b(?:I|I['’]m|I['’]ve|me|my|we|we['’]re|we['’]ve|us|our|ours)\b", re.IGNORECASE)
+QUESTION_RE = re.compile(
+    r"^\s*(?:what|how|when|where|which|who|why|can|could|should|would|do|does|is|are|will)\b", re.IGNORECASE
+)
+
+
+# ================= RESULT =================
+@dataclass
+class Extraction:
+    """Facts found in one user message, in the server's memory schema.
+
+    `confidence` is the weakest field's confidence, capped low when the text
+    has fact cues the patterns couldn't resolve; a message with no facts and
+    no cues is confidently empty (1.0). `cues` is True when the message looks
+    like it states something about the user or their wedding, which includes
+    a bare short answer to Emily's last question and any statement with
+    wedding, first-person or numeric context that no pattern resolved.
+    """
+
+    facts: dict = field(default_factory=dict)
+    confidence: float = 1.0
+    cues: bool = False
+    fields: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def plausible(self) -> bool:
+        return bool(self.fields) or self.cues
+
+    def needs_llm(self, threshold: float) -> bool:
+        return self.plausible and self.confidence < threshold
+
+
+def _set(result: Extraction, section: str, key: str, value, confidence: float):
+    current = result.fields.get(key)
+    if current is not None and current >= confidence:
+        return
+    result.facts.setdefault(section, {})[key] = value
+    result.fields[key] = confidence
+
+
+# ================= FIELDS =================
+def _is_name(word: str) -> bool:
+    word = word.lower()
+    return word not in NOT_NAMES and word not in NOT_NAME_WORDS
+
+
+def _name(text: str, result: Extraction):
+    for pattern, confidence in NAME_PATTERNS:
+        m = pattern.search(text)
+        if m and _is_name(m.group(1)):
+            name = m.group(1)
+            if name.islower() or name.isupper():
+                name = name.capitalize()
+            _set(result, "profile", "name", name, confidence)
+            return
+
+
+def _partner(text: str, result: Extraction):
+    for pattern, confidence in PARTNER_PATTERNS:
+        m = pattern.search(text)
+        if m and _is_name(m.group(1)):
+            if m.group(1) == result.facts.get("profile", {}).get("name"):
+                continue
+            _set(result, "profile", "partner", m.group(1), confidence)
+            return
+
+
+def _sentence(text: str, pos: int) -> str:
+    for m in SENTENCE_RE.finditer(text):
+        if m.start() <= pos < m.end():
+            return m.group(0)
+    return text
+
+
+def _place(text: str, regex: re.Pattern, gazetteer: Dict[str, str], key: str, result: Extraction):
+    found = {}
+    for m in regex.finditer(text):
+        alias = m.group(1).lower()
+        # "us" is too common as a pronoun to trust without an explicit "the US".
+        if alias == "us" and not re.search(r"\bthe\s+$", text[:m.start()], re.IGNORECASE):
+            continue
+        before = text[max(0, m.start() - 20):m.start()]
+        if ORIGIN_CONTEXT_RE.search(before):
+            continue
+        if text.strip(" .!").lower() == alias:
+            # The whole message is the place, i.e. an answer to "where?".
+            confidence = 0.85
+        elif PLACE_CONTEXT_RE.search(before):
+            confidence = 0.9 if WEDDING_CONTEXT_RE.search(_sentence(text, m.start())) else 0.6
+        else:
+            confidence = 0.6
+        canonical = gazetteer[alias]
+        found[canonical] = max(found.get(canonical, 0), confidence)
+
+    if len(found) == 1:
+        (value, confidence), = found.items()
+        _set(result, "wedding", key, value, confidence)
+    elif len(found) > 1:
+        # Several places in one message ("from Spain, marrying in Italy") — let the LLM decide.
+        value, confidence = max(found.items(), key=lambda kv: kv[1])
+        _set(result, "wedding", key, value, min(confidence, 0.4))
+
+
+def _date(text: str, result: Extraction):
+    for pattern, kind in DATE_PATTERNS:
+        m = pattern.search(text)
+        if not m:
+            continue
+
+        confidence = 0.9
+        if kind == "mdy":
+            month, day, year = MONTHS[m.group(1).lower()], int(m.group(2)), int(m.group(3))
+        elif kind == "dmy":
+            day, month, year = int(m.group(1)), MONTHS[m.group(2).lower()], int(m.group(3))
+        elif kind == "iso":
+            year, month, day = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        elif kind == "numeric":
+            a, b, year = int(m.group(1)), int(m.group(2)), int(m.group(3))
+            if a > 12:
+                day, month = a, b
+            elif b > 12:
+                month, day = a, b
+            else:
+                day, month, confidence = a, b, 0.4
+        else:
+            month, year = MONTHS[m.group(1).lower()], int(m.group(2))
+            _set(result, "wedding", "date", f"{MONTH_NAMES[month]} {year}", 0.8)
+            return
+
+        if 1 <= month <= 12 and 1 <= day <= 31:
+            _set(result, "wedding", "date", f"{year:04d}-{month:02d}-{day:02d}", confidence)
+            return
+
+    m = YEAR_RE.search(text)
+    if m:
+        _set(result, "wedding", "date", m.group(1), 0.6)
+
+
+def _guests(text: str, result: Extraction):
+    m = GUESTS_RE.search(text) or GUEST_LIST_RE.search(text)
+    if not m:
+        return
+    raw = m.group(1).lower()
+    count = NUMBER_WORDS.get(raw) or int(raw)
+    if not 2 <= count <= 2000:
+        return
+
+    confidence = 0.9 if raw.isdigit() else 0.8
+    if re.search(r"\b(?:people|persons)\b", m.group(0), re.IGNORECASE) and not GUEST_CONTEXT_RE.search(text):
+        confidence = 0.6
+    # "10 guests maybe 20": another number in the same sentence makes the count uncertain.
+    sentence = _sentence(text, m.start(1))
+    if sum(1 for n in NUMBER_RE.finditer(sentence)) > 1:
+        confidence = min(confidence, 0.5)
+    _set(result, "wedding", "guests_count", count, confidence)
+
+
+def _amount(raw: str) -> Optional[int]:
+    raw = raw.strip().lower().replace(" ", "")
+    multiplier = 1
+    for suffix, mult in (("thousand", 1000), ("million", 1000000), ("mn", 1000000), ("k", 1000), ("m", 1000000)):
+        if raw.endswith(suffix):
+            raw, multiplier = raw[:-len(suffix)], mult
+            break
+    digits = raw.lstrip("$€£").replace(",", "")
+    try:
+        return int(float(digits) * multiplier)
+    except ValueError:
+        return None
+
+
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP"}
+CURRENCY_WORDS = {"usd": "USD", "dollar": "USD", "dollars": "USD", "eur": "EUR", "euro": "EUR",
+                  "euros": "EUR", "pound": "GBP", "pounds": "GBP", "gbp": "GBP", "chf": "CHF"}
+
+
+def _budget(text: str, result: Extraction):
+    m = BUDGET_RE.search(text)
+    spend = m is None
+    if spend:
+        m = SPEND_RE.search(text)
+    if not m:
+        return
+    low, high = _amount(m.group(1)), _amount(m.group(2)) if m.group(2) else None
+    if low is None:
+        return
+    # "30-40k": the suffix on the upper bound applies to both.
+    if high is not None and low < 1000 <= high:
+        low *= 1000
+
+    currency = CURRENCY_WORDS.get((m.group(3) or "").lower())
+    if currency is None:
+        symbol = next((s for s in CURRENCY_SYMBOLS if s in m.group(0)), None)
+        currency = CURRENCY_SYMBOLS.get(symbol)
+
+    value = f"{low:,}" if high is None else f"{low:,}-{high:,}"
+    if currency:
+        value += f" {currency}"
+    confidence = 0.85 if low >= 100 else 0.4
+    # "spend 10 hours" is not money; without a currency or budget word it needs the LLM.
+    if spend and not currency and not re.search(r"\bbudget\b", text, re.IGNORECASE):
+        confidence = min(confidence, 0.5)
+    _set(result, "wedding", "budget_range", value, confidence)
+
+
+def _style(text: str, result: Extraction):
+    styles = []
+    for m in STYLE_RE.finditer(text):
+        style = m.group(1).lower()
+        if style not in styles:
+            styles.append(style)
+    if not styles:
+        return
+    confidence = 0.85 if STYLE_CONTEXT_RE.search(text) else 0.5
+    _set(result, "wedding", "style", ", ".join(styles), confidence)
+
+
+def _capitalized(token: str) -> bool:
+    return token[:1].isupper() and token.lower() not in NOT_VENUE_WORDS
+
+
+def _venue_names(clause: str, sentence_start: bool) -> List[str]:
+    tokens = [t.strip(".!?:\"“”()") for t in clause.split()]
+    names = []
+    for i, token in enumerate(tokens):
+        if token not in VENUE_KEYWORDS:
+            continue
+        # Grow around the keyword over capitalized words, and over particles
+        # only when they sit between two capitalized words ("Castello di X").
+        left = i
+        while left > 0:
+            prev = tokens[left - 1]
+            if _capitalized(prev) and not (sentence_start and left - 1 == 0 and prev != "The"):
+                left -= 1
+            elif prev.lower() in PARTICLES and left > 1 and _capitalized(tokens[left - 2]) \
+                    and not (sentence_start and left - 2 == 0):
+                left -= 1
+            else:
+                break
+        right = i
+        while right + 1 < len(tokens):
+            nxt = tokens[right + 1]
+            if _capitalized(nxt):
+                right += 1
+            elif nxt.lower() in PARTICLES and right + 2 < len(tokens) and _capitalized(tokens[right + 2]):
+                right += 1
+            else:
+                break
+        while left < i and tokens[left].lower() in PARTICLES - {"the"}:
+            left += 1
+        name = " ".join(tokens[left:right + 1])
+        # A lone keyword ("the Hotel") is not a venue name.
+        if len(name.split()) >= 2 and name not in names:
+            names.append(name)
+    return names
+
+
+def _venues(text: str, result: Extraction):
+    venues = []
+    for sentence in SENTENCE_SPLIT_RE.split(text):
+        for n, clause in enumerate(CLAUSE_SPLIT_RE.split(sentence)):
+            for name in _venue_names(clause, sentence_start=n == 0):
+                if name not in venues:
+                    venues.append(name)
+    if venues:
+        confidence = 0.85 if VENUE_CONTEXT_RE.search(text) else 0.6
+        _set(result, "wedding", "venue_shortlist", venues, confidence)
+
+
+# ================= ENTRY POINT =================
+def extract_facts(text: str) -> Extraction:
+    result = Extraction()
+    text = (text or "").strip()
+    if not text:
+        return result
+
+    _name(text, result)
+    _partner(text, result)
+    _place(text, COUNTRY_RE, COUNTRIES, "country", result)
+    _place(text, CITY_RE, CITIES, "city", result)
+    _date(text, result)
+    _guests(text, result)
+    _budget(text, result)
+    _style(text, result)
+    _venues(text, result)
+
+    small_talk = SMALL_TALK_RE.fullmatch(text) is not None
+    question = text.rstrip().endswith("?") or QUESTION_RE.match(text) is not None
+
+    unresolved = False
+    for fields, cue in FIELD_CUES:
+        if cue.search(text):
+            result.cues = True
+            if not any(f in result.fields for f in fields):
+                unresolved = True
+
+    if small_talk or (question and not result.fields):
+        # Small talk and plain questions carry nothing worth an extraction call.
+        result.cues = False
+        result.confidence = 1.0
+        return result
+
+    if not result.fields and (
+        len(text.split()) <= SHORT_ANSWER_WORDS
+        or WEDDING_CONTEXT_RE.search(text)
+        or FIRST_PERSON_RE.search(text)
+        or NUMBER_RE.search(text)
+    ):
+        result.cues = True
+        unresolved = True
+
+    if result.fields:
+        result.confidence = min(result.fields.values())
+        # A question mentioning a place or date is usually hypothetical.
+        if question:
+            result.confidence = min(result.confidence, 0.5)
+    if unresolved:
+        result.confidence = min(result.confidence, 0.3)
+
+    return result
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class _Slot:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class KeyedLocks:
+    """One asyncio.Lock per key, created on demand.
+
+    A key's lock is dropped as soon as nobody holds or waits for it, so memory
+    is bounded by the number of concurrent requests, not by the number of
+    tokens or conversations ever seen.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._slots: Dict[str, _Slot] = {}
+
+        self.acquired = 0
+        self.queued = 0
+        self.peak_keys = 0
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot()
+            self.peak_keys = max(self.peak_keys, len(self._slots))
+        slot.users += 1
+        if slot.lock.locked():
+            self.queued += 1
+
+        try:
+            async with slot.lock:
+                self.acquired += 1
+                yield
+        finally:
+            slot.users -= 1
+            if slot.users == 0:
+                del self._slots[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "keys": len(self._slots),
+            "waiting": sum(s.users - (1 if s.lock.locked() else 0) for s in self._slots.values()),
+            "peak_keys": self.peak_keys,
+            "acquired": self.acquired,
+            "queued": self.queued,
+        }
+
+
+class InFlight:
+    """Shares one in-progress result between identical concurrent requests.
+
+    The first caller for a key starts the work as its own task; callers
+    arriving while it runs await the same future. Because the work is a
+    separate task, a disconnecting client (leader or follower) never cancels
+    a call other requests are waiting on, and the future always settles.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, asyncio.Future] = {}
+
+        self.leaders = 0
+        self.coalesced = 0
+
+    def start(self, key: str, work: Callable[[], Awaitable[Any]]) -> Tuple[asyncio.Future, bool]:
+        """Return (future, shared): the running work for `key`, or `work()` started as a new task."""
+        future = self._pending.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return future, True
+
+        task = asyncio.ensure_future(work())
+        self._pending[key] = task
+        self.leaders += 1
+        task.add_done_callback(lambda t: self._settle(key, t))
+        return task, False
+
+    def _settle(self, key: str, task: asyncio.Future):
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        # Followers may all disconnect; don't warn about an unretrieved exception.
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key: str, work: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run `work` once per key at a time; returns (result, shared)."""
+        future, shared = self.start(key, work)
+        return await asyncio.shield(future), shared
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "inflight": len(self._pending),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+def request_key(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
@@ -0,0 +1,230 @@
+import asyncio
+import copy
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class Entry:
+    data: dict
+    dirty: bool
+    version: int
+    loaded_at: float
+    # Fields changed here since the last successful flush; only these are written.
+    changes: dict = field(default_factory=dict)
+
+
+class MemoryCache:
+    """Write-behind cache in front of the emily_memories table.
+
+    Consistency:
+    - Reads go through the cache; a miss (or a clean entry older than `ttl`)
+      awaits `loader` and caches the result. Concurrent misses for the same
+      token share a single load.
+    - `update()` merges in place and only marks the entry dirty when the
+      merge actually changed something, so all-null extractions never reach
+      the database.
+    - Dirty entries are written with one batched `saver` call per flush
+      (interval and shutdown). The saver receives only the fields this
+      process changed since the last flush, so it can merge them over the
+      current row without overwriting what other workers saved, and may
+      return the merged rows to refresh the cache. An entry is marked clean
+      only if it was not updated again while the write was in flight.
+    - A dirty entry is never dropped: LRU eviction parks it in a write-back
+      buffer that is flushed first and is checked before the loader. Entries
+      leave the buffer only once their write has committed, so a read after
+      eviction (or during the flush) still sees the unflushed data.
+
+    Callers always receive a copy; the cached dict is never shared.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Awaitable[dict]],
+        saver: Callable[[List[Tuple[str, dict]]], Awaitable[Optional[Dict[str, dict]]]],
+        merge: Callable[[dict, dict], dict],
+        ttl: float = 600.0,
+        max_entries: int = 5000,
+        batch_size: int = 500,
+    ):
+        self.loader = loader
+        self.saver = saver
+        self.merge = merge
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self._evicted: Dict[str, Entry] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.updates = 0
+        self.unchanged = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.flush_errors = 0
+
+    # ---------- reads ----------
+    def _lookup(self, token: str) -> Optional[Entry]:
+        entry = self._entries.get(token)
+        if entry is None:
+            entry = self._evicted.pop(token, None)
+            if entry is not None:
+                self._insert(token, entry)
+            return entry
+
+        if not entry.dirty and time.monotonic() - entry.loaded_at > self.ttl:
+            del self._entries[token]
+            return None
+
+        self._entries.move_to_end(token)
+        return entry
+
+    def _insert(self, token: str, entry: Entry):
+        self._entries[token] = entry
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            old_token, old = self._entries.popitem(last=False)
+            self.evictions += 1
+            if old.dirty:
+                self._evicted[old_token] = old
+
+    async def _entry(self, token: str) -> Entry:
+        with self._lock:
+            entry = self._lookup(token)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        loading = self._loading.get(token)
+        if loading is not None:
+            return await asyncio.shield(loading)
+
+        loading = asyncio.get_running_loop().create_future()
+        self._loading[token] = loading
+        try:
+            data = await self.loader(token)
+            with self._lock:
+                entry = self._lookup(token)
+                if entry is None:
+                    entry = Entry(data=data, dirty=False, version=0, loaded_at=time.monotonic())
+                    self._insert(token, entry)
+            loading.set_result(entry)
+            return entry
+        except Exception as e:
+            loading.set_exception(e)
+            loading.exception()
+            raise
+        except BaseException:
+            loading.cancel()
+            raise
+        finally:
+            del self._loading[token]
+
+    async def get(self, token: str) -> dict:
+        entry = await self._entry(token)
+        with self._lock:
+            return copy.deepcopy(entry.data)
+
+    # ---------- writes ----------
+    async def update(self, token: str, extracted: dict) -> bool:
+        entry = await self._entry(token)
+        with self._lock:
+            before = copy.deepcopy(entry.data)
+            entry.data = self.merge(entry.data, extracted)
+            self.updates += 1
+            if entry.data == before:
+                self.unchanged += 1
+                return False
+
+            entry.changes = self.merge(entry.changes, diff(before, entry.data))
+            entry.dirty = True
+            entry.version += 1
+            if token not in self._entries and token not in self._evicted:
+                self._evicted[token] = entry
+            return True
+
+    async def flush(self) -> int:
+        with self._lock:
+            # Evicted entries stay in the write-back buffer until their write
+            # commits, so reads during the flush don't reload stale rows.
+            pending = list(self._evicted.items()) + [
+                (token, entry) for token, entry in self._entries.items() if entry.dirty
+            ]
+            snapshot = [(token, entry, entry.version, copy.deepcopy(entry.changes)) for token, entry in pending]
+
+        written = 0
+        for i in range(0, len(snapshot), self.batch_size):
+            batch = snapshot[i:i + self.batch_size]
+            try:
+                saved = await self.saver([(token, changes) for token, _, _, changes in batch]) or {}
+            except Exception as e:
+                self.flush_errors += 1
+                print("MEMORY FLUSH ERROR:", e)
+                break
+
+            with self._lock:
+                for token, entry, version, changes in batch:
+                    if entry.version == version:
+                        entry.dirty = False
+                        entry.changes = {}
+                        entry.loaded_at = time.monotonic()
+                        if token in saved:
+                            entry.data = saved[token]
+                    else:
+                        # Updated mid-write: keep only what the write didn't already cover.
+                        entry.changes = diff(changes, entry.changes)
+                        if self._evicted.get(token) is entry:
+                            del self._evicted[token]
+            written += len(batch)
+
+        if written:
+            self.flushes += 1
+            self.flushed_rows += written
+        return written
+
+    async def run_flusher(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    # ---------- observability ----------
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            size = len(self._entries)
+            dirty = sum(1 for e in self._entries.values() if e.dirty) + len(self._evicted)
+
+        return {
+            "entries": size,
+            "dirty": dirty,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "updates": self.updates,
+            "unchanged_updates": self.unchanged,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "flush_errors": self.flush_errors,
+        }
+
+
+def diff(before: dict, after: dict) -> dict:
+    """Leaves of `after` that are new or differ from `before`."""
+    changed = {}
+    for key, value in after.items():
+        old = before.get(key)
+        if isinstance(value, dict):
+            nested = diff(old if isinstance(old, dict) else {}, value)
+            if nested:
+                changed[key] = nested
+        elif value != old:
+            changed[key] = value
+    return changed
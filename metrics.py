@@ -0,0 +1,183 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{format_labels(k)} {v}" for k, v in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            # bucket counts, then +Inf, sum
+            data = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += 1
+            data[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = self.header()
+        for key, data in items:
+            for bound, count in zip(self.buckets, data):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{format_labels(key, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{format_labels(key, le)} {data[-2]}")
+            lines.append(f"{self.name}_count{format_labels(key)} {data[-2]}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {data[-1]}")
+        return lines
+
+
+# ================= HOT PATH =================
+REQUEST_SECONDS = Histogram("emily_request_seconds", "End-to-end /chat latency by route.")
+REQUESTS = Counter("emily_requests_total", "Handled /chat requests by route and outcome.")
+STAGE_SECONDS = Histogram("emily_stage_seconds", "Time spent per pipeline stage.")
+STAGE_ERRORS = Counter("emily_stage_errors_total", "Exceptions raised per pipeline stage.")
+LLM_TOKENS = Counter("emily_llm_tokens_total", "OpenAI token usage by call and kind (prompt, completion, cached).")
+SLOW_REQUESTS = Counter("emily_slow_requests_total", "Requests over the slow-request threshold.")
+FIRST_TOKEN_SECONDS = Histogram("emily_first_token_seconds", "Time from request start to the first streamed token.")
+EXTRACTION_ROUTES = Counter("emily_extraction_route_total", "How each turn's memory extraction was handled (skip, local, local_queued, llm).")
+
+REGISTRY: List[Metric] = [
+    REQUEST_SECONDS, REQUESTS, STAGE_SECONDS, STAGE_ERRORS, LLM_TOKENS, SLOW_REQUESTS, FIRST_TOKEN_SECONDS,
+    EXTRACTION_ROUTES,
+]
+
+
+class Trace:
+    """Per-request stage breakdown, logged when the request is slower than `slow_ms`."""
+
+    def __init__(self, route: str, slow_ms: Optional[float] = None):
+        self.route = route
+        self.slow_ms = slow_ms
+        self.start = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+        self.ttft: Optional[float] = None
+        self.done = False
+
+    def first_token(self):
+        """Mark the first streamed token; recorded once, as time since the request started."""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.start
+            FIRST_TOKEN_SECONDS.observe(self.ttft, route=self.route)
+
+    def finish(self, status: str = "ok"):
+        if self.done:
+            return
+        self.done = True
+        elapsed = time.perf_counter() - self.start
+        REQUEST_SECONDS.observe(elapsed, route=self.route)
+        REQUESTS.inc(route=self.route, status=status)
+
+        if self.slow_ms is not None and elapsed * 1000 >= self.slow_ms:
+            SLOW_REQUESTS.inc(route=self.route)
+            breakdown = " ".join(f"{name}={ms:.0f}ms" for name, ms in self.stages)
+            if self.ttft is not None:
+                breakdown += f" ttft={self.ttft * 1000:.0f}ms"
+            print(f"SLOW REQUEST: {self.route} {elapsed * 1000:.0f}ms status={status} {breakdown}")
+
+
+@contextmanager
+def stage(name: str, trace: Optional[Trace] = None):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        if trace is not None:
+            trace.stages.append((name, elapsed * 1000))
+
+
+def record_usage(call: str, usage):
+    if usage is None:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens or 0, call=call, kind="prompt")
+    LLM_TOKENS.inc(usage.completion_tokens or 0, call=call, kind="completion")
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached:
+        LLM_TOKENS.inc(cached, call=call, kind="cached")
+
+
+# ================= EXPOSITION =================
+def stats_family(prefix: str, stats: Dict[str, object], counters: Iterable[str] = ()) -> List[str]:
+    """Render a component's stats() dict: keys in `counters` as counters, other numbers as gauges."""
+    counters = set(counters)
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if key in counters:
+            name = f"{prefix}_{key}_total"
+            lines += [f"# TYPE {name} counter", f"{name} {value}"]
+        else:
+            name = f"{prefix}_{key}"
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return lines
+
+
+def render(extra: Iterable[str] = ()) -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    lines += list(extra)
+    return "\n".join(lines) + "\n"
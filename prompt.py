@@ -0,0 +1,263 @@
+import json
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from facts import extract_facts
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a chars/4 estimate
+    tiktoken = None
+
+# Framing tokens the chat format adds around every message, and the reply primer.
+MESSAGE_OVERHEAD = 4
+REPLY_PRIMER = 3
+
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+SUMMARY_LINE_CHARS = 160
+# Folded facts are kept at the extractor's local-merge confidence.
+SUMMARY_FACT_CONFIDENCE = 0.8
+
+STOPWORDS = {
+    "about", "after", "again", "also", "because", "been", "being", "could", "does", "doing",
+    "from", "have", "having", "here", "into", "just", "like", "maybe", "more", "much", "need",
+    "only", "other", "really", "should", "some", "than", "that", "their", "them", "then",
+    "there", "these", "they", "thing", "things", "this", "those", "very", "want", "were",
+    "what", "when", "where", "which", "while", "with", "would", "your", "yours", "ours",
+    "sure", "think", "know", "thanks", "okay", "sounds", "good", "great", "lovely", "wedding",
+    "expect", "around", "shall", "talk", "long", "pick", "start", "first", "next", "make",
+}
+WORD_RE = re.compile(r"[A-Za-zÀ-ÿ][A-Za-zÀ-ÿ'’-]{3,}")
+
+
+@dataclass
+class Prompt:
+    messages: List[dict]
+    tokens: int
+    dropped: int
+    summary: str
+
+
+class PromptBuilder:
+    """Assembles the per-turn message list within a token budget.
+
+    Layout, most stable first so provider-side prompt caching keeps hitting:
+
+    1. system: emily_prompt.txt, byte-identical, plus the page line
+    2. system: rolling summary of turns that fell out of the budget
+    3. the kept history turns
+    4. system: current memory, compact JSON, rebuilt every turn
+    5. the new user message
+
+    When the history does not fit, the oldest exchanges (a user message and
+    Emily's reply) are dropped whole and folded into the summary; the caller
+    persists that with ConversationStore.compact(). The summary is built
+    locally, without an LLM call, and degrades in steps as it fills up:
+    confident facts are always kept (latest value wins), recent exchanges
+    are kept as one clipped line each, and older lines are compressed to
+    topic keywords before anything is discarded.
+    """
+
+    def __init__(
+        self,
+        base_prompt: str,
+        budget: int = 6000,
+        summary_budget: int = 400,
+        encoding: str = "o200k_base",
+    ):
+        self.base_prompt = base_prompt
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception as e:
+                print("TOKENIZER UNAVAILABLE:", e)
+
+        self.turns = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.last_tokens = 0
+        self.folded_turns = 0
+        self.truncated = 0
+
+    # ---------- counting ----------
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text) // 4 + 1
+
+    def message_tokens(self, message: dict) -> int:
+        return MESSAGE_OVERHEAD + self.count(message["content"])
+
+    def truncate(self, text: str, tokens: int) -> str:
+        if self._encoding is not None:
+            ids = self._encoding.encode(text, disallowed_special=())
+            return self._encoding.decode(ids[:max(0, tokens)])
+        return text[:max(0, tokens - 1) * 4]
+
+    # ---------- parts ----------
+    def head(self, page: str) -> dict:
+        page_context = f"\n\nThe user is currently on the '{page}' page of FloWWed Studio."
+        return {"role": "system", "content": self.base_prompt + page_context}
+
+    def memory_context(self, memory: dict) -> dict:
+        compact = json.dumps(prune(memory), ensure_ascii=False, separators=(",", ":"))
+        return {"role": "system", "content": f"Known user memory: {compact}"}
+
+    def fold(self, summary: str, turns: List[Tuple[str, str]]) -> str:
+        facts, topics, lines = parse_summary(summary)
+        for role, content in turns:
+            text = " ".join(content.split())
+            if role == "user":
+                result = extract_facts(text)
+                for section in result.facts.values():
+                    for key, value in section.items():
+                        if result.fields[key] >= SUMMARY_FACT_CONFIDENCE:
+                            facts.pop(key, None)
+                            facts[key] = ", ".join(map(str, value)) if isinstance(value, list) else str(value)
+                lines.append(f"User: {clip(text)}")
+            else:
+                # Emily's answers are reconstructible; the question she asked is what matters.
+                question = next((q for q in reversed(re.split(r"(?<=[.!?])\s+", text)) if q.endswith("?")), None)
+                if question:
+                    lines.append(f"Emily asked: {clip(question)}")
+
+        summary = render_summary(facts, topics, lines)
+        while lines and self.count(summary) > self.summary_budget:
+            line = lines.pop(0)
+            for word in keywords(line.split(": ", 1)[-1]):
+                if word not in topics:
+                    topics.append(word)
+            summary = render_summary(facts, topics, lines)
+        while topics and self.count(summary) > self.summary_budget:
+            topics.pop(0)
+            summary = render_summary(facts, topics, lines)
+        return summary
+
+    # ---------- assembly ----------
+    def build(
+        self,
+        page: str,
+        memory: dict,
+        summary: str,
+        turns: List[Tuple[str, str]],
+        text: Optional[str] = None,
+    ) -> Prompt:
+        head = self.head(page)
+        context = self.memory_context(memory)
+
+        # The summary budget is always reserved so folding never overflows.
+        reserved = (self.message_tokens(head) + self.message_tokens(context) + MESSAGE_OVERHEAD
+                    + self.count(SUMMARY_HEADER) + self.summary_budget + REPLY_PRIMER)
+        tail = [context]
+        if text:
+            room = self.budget - reserved - MESSAGE_OVERHEAD
+            if self.count(text) > room:
+                text = self.truncate(text, room)
+                self.truncated += 1
+            tail.append({"role": "user", "content": text})
+        available = self.budget - reserved - sum(self.message_tokens(m) for m in tail[1:])
+
+        # Keep whole exchanges, newest first, so history never opens on an
+        # assistant reply whose question was dropped.
+        kept_from = len(turns)
+        used = 0
+        for start in reversed(exchange_starts(turns)):
+            cost = sum(self.message_tokens({"role": r, "content": c}) for r, c in turns[start:kept_from])
+            if used + cost > available:
+                break
+            used += cost
+            kept_from = start
+        kept = [{"role": role, "content": content} for role, content in turns[kept_from:]]
+
+        dropped = kept_from
+        if dropped:
+            summary = self.fold(summary, turns[:dropped])
+            self.folded_turns += dropped
+
+        messages = [head]
+        if summary:
+            messages.append({"role": "system", "content": SUMMARY_HEADER + summary})
+        messages.extend(kept)
+        messages.extend(tail)
+
+        tokens = sum(self.message_tokens(m) for m in messages) + REPLY_PRIMER
+        self.record(tokens)
+        return Prompt(messages=messages, tokens=tokens, dropped=dropped, summary=summary)
+
+    # ---------- observability ----------
+    def record(self, tokens: int):
+        self.turns += 1
+        self.total_tokens += tokens
+        self.last_tokens = tokens
+        self.max_tokens = max(self.max_tokens, tokens)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "tokenizer": "tiktoken" if self._encoding is not None else "estimate",
+            "budget": self.budget,
+            "turns": self.turns,
+            "last_prompt_tokens": self.last_tokens,
+            "max_prompt_tokens": self.max_tokens,
+            "avg_prompt_tokens": round(self.total_tokens / self.turns, 1) if self.turns else 0,
+            "folded_turns": self.folded_turns,
+            "truncated_messages": self.truncated,
+        }
+
+
+def prune(value):
+    """Drop null/empty leaves so the memory JSON only carries known facts."""
+    if isinstance(value, dict):
+        pruned = {k: prune(v) for k, v in value.items()}
+        return {k: v for k, v in pruned.items() if v not in (None, "", [], {})}
+    return value
+
+
+def exchange_starts(turns: List[Tuple[str, str]]) -> List[int]:
+    """Indexes where an exchange begins: each user message, plus a leading greeting."""
+    starts = [i for i, (role, _) in enumerate(turns) if role == "user"]
+    if turns and (not starts or starts[0] != 0):
+        starts.insert(0, 0)
+    return starts
+
+
+def clip(text: str) -> str:
+    if len(text) <= SUMMARY_LINE_CHARS:
+        return text
+    return text[:SUMMARY_LINE_CHARS].rsplit(" ", 1)[0] + "…"
+
+
+def keywords(text: str, limit: int = 3) -> List[str]:
+    words = [w.lower().strip("'’-") for w in WORD_RE.findall(text)]
+    counts = Counter(w for w in words if w not in STOPWORDS)
+    return [w for w, _ in counts.most_common(limit)]
+
+
+def parse_summary(summary: str):
+    facts: Dict[str, str] = {}
+    topics: List[str] = []
+    lines: List[str] = []
+    for line in (summary or "").splitlines():
+        if line.startswith("Known facts: "):
+            for item in line[len("Known facts: "):].split("; "):
+                key, _, value = item.partition("=")
+                if value:
+                    facts[key] = value
+        elif line.startswith("Earlier topics: "):
+            topics = line[len("Earlier topics: "):].split(", ")
+        elif line:
+            lines.append(line)
+    return facts, topics, lines
+
+
+def render_summary(facts: Dict[str, str], topics: List[str], lines: List[str]) -> str:
+    out = []
+    if facts:
+        out.append("Known facts: " + "; ".join(f"{k}={v}" for k, v in facts.items()))
+    if topics:
+        out.append("Earlier topics: " + ", ".join(topics))
+    return "\n".join(out + lines)
@@ -1,19 +1,54 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from openai import OpenAI
-from supabase import create_client
+from openai import AsyncOpenAI
+from supabase_rest import SupabaseREST
+from extraction_queue import ExtractionQueue, Turn
+from memory_cache import MemoryCache
+from sessions import Conversation, ConversationBackend, ConversationStore, SQLiteConversationStore
+from prompt import Prompt, PromptBuilder
+from metrics import EXTRACTION_ROUTES, Trace, record_usage, stage, stats_family
+from facts import extract_facts
+from locks import InFlight, KeyedLocks, request_key
+import metrics
+import asyncio
+import httpx
 import json
 import os
-from typing import Optional, Dict, List
+from typing import Dict, Optional, List
 
 # ================= ENV =================
 SUPABASE_URL = os.environ["SUPABASE_URL"]
 SUPABASE_KEY = os.environ["SUPABASE_SERVICE_KEY"]
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-client = OpenAI()
+# Pool and concurrency limits; one worker should hold hundreds of slow LLM calls.
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", "1000"))
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", "60"))
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "800"))
+SUPABASE_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_MAX_CONNECTIONS", "50"))
+SUPABASE_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", "10"))
+
+# Log a per-stage breakdown for requests slower than this; unset disables sampling.
+SLOW_REQUEST_MS = float(os.environ["SLOW_REQUEST_MS"]) if os.environ.get("SLOW_REQUEST_MS") else None
+
+supabase = SupabaseREST(
+    SUPABASE_URL,
+    SUPABASE_KEY,
+    max_connections=SUPABASE_MAX_CONNECTIONS,
+    timeout=SUPABASE_TIMEOUT,
+)
+client = AsyncOpenAI(
+    timeout=OPENAI_TIMEOUT,
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+        ),
+        timeout=OPENAI_TIMEOUT,
+    ),
+)
+llm_slots = asyncio.Semaphore(LLM_CONCURRENCY)
 
 # ================= APP =================
 app = FastAPI()
@@ -40,17 +75,24 @@ def get_page(request: Request) -> str:
 def get_session_id(request: Request) -> str:
     return request.query_params.get("_") or "default"
 
-def load_memory(token: str) -> dict:
-    res = supabase.table("emily_memories").select("data").eq("token", token).execute()
-    if res.data:
-        return res.data[0]["data"]
+async def load_memory(token: str) -> dict:
+    with stage("supabase_select"):
+        rows = await supabase.select("emily_memories", "data", token=token)
+    if rows:
+        return rows[0]["data"]
     return {"profile": {}, "wedding": {}}
 
-def save_memory(token: str, data: dict):
-    supabase.table("emily_memories").upsert({
-        "token": token,
-        "data": data
-    }).execute()
+async def save_memories(rows: List[tuple]) -> Dict[str, dict]:
+    with stage("save_memory"):
+        # `rows` carry only the fields this worker changed; merge them over the
+        # current row so facts other workers saved meanwhile survive.
+        current = await supabase.select_in("emily_memories", "token,data", "token", [t for t, _ in rows])
+        stored = {row["token"]: row["data"] or {} for row in current}
+        merged = {token: merge(stored.get(token, {}), changes) for token, changes in rows}
+        await supabase.upsert("emily_memories", [
+            {"token": token, "data": data} for token, data in merged.items()
+        ])
+    return merged
 
 def has_any_memory(memory: dict) -> bool:
     return bool(memory.get("profile") or memory.get("wedding"))
@@ -63,26 +105,71 @@ def merge(a, b):
             a[k] = v
     return a
 
+# ================= MEMORY CACHE =================
+MEMORY_FLUSH_SECONDS = float(os.environ.get("MEMORY_FLUSH_SECONDS", "5"))
+
+memory_cache = MemoryCache(
+    load_memory,
+    save_memories,
+    merge,
+    ttl=float(os.environ.get("MEMORY_CACHE_TTL", "600")),
+    max_entries=int(os.environ.get("MEMORY_CACHE_SIZE", "5000")),
+)
+
 # ================= CONVERSATIONS =================
-conversations: Dict[str, List[dict]] = {}
+# "memory" is per process; use "sqlite" when running several uvicorn workers.
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")
+
+def make_conversation_store() -> ConversationBackend:
+    if SESSION_BACKEND == "sqlite":
+        return SQLiteConversationStore(
+            os.environ.get("SESSION_DB_PATH", "sessions.db"),
+            idle_ttl=float(os.environ.get("SESSION_IDLE_TTL", str(7 * 24 * 3600))),
+        )
+    if SESSION_BACKEND == "memory":
+        return ConversationStore(
+            max_entries=int(os.environ.get("SESSION_MAX_ENTRIES", "10000")),
+            idle_ttl=float(os.environ.get("SESSION_IDLE_TTL", "3600")),
+            spill_path=os.environ.get("SESSION_SPILL_PATH") or None,
+        )
+    raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND}")
+
+conversations = make_conversation_store()
+
+prompt_builder = PromptBuilder(
+    BASE_PROMPT,
+    budget=int(os.environ.get("PROMPT_TOKEN_BUDGET", "6000")),
+    summary_budget=int(os.environ.get("PROMPT_SUMMARY_TOKENS", "400")),
+)
+
+def conversation_key(token: str, page: str, sid: str) -> str:
+    return f"{token}:{page}:{sid}"
 
-def get_conversation(token: str, page: str, sid: str, memory: dict) -> List[dict]:
-    key = f"{token}:{page}:{sid}"
+async def store_call(fn, *args):
+    if conversations.blocking:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
 
-    if key not in conversations:
-        page_context = f"\n\nThe user is currently on the '{page}' page of FloWWed Studio."
-        memory_context = f"\n\nKnown user memory:\n{json.dumps(memory, ensure_ascii=False, indent=2)}"
-        system_prompt = BASE_PROMPT + page_context + memory_context
+def _get_or_create(key: str) -> Conversation:
+    return conversations.get(key) or conversations.create(key)
 
-        conversations[key] = [
-            {"role": "system", "content": system_prompt}
-        ]
+async def get_conversation(key: str) -> Conversation:
+    return await store_call(_get_or_create, key)
 
-    return conversations[key]
+def _commit(key: str, compact_to: int, summary: str, messages: List[dict]):
+    if compact_to:
+        conversations.compact(key, compact_to, summary)
+    conversations.append(key, messages)
 
-def trim(conv: List[dict], max_messages: int = 40):
-    if len(conv) > max_messages:
-        conv[:] = [conv[0]] + conv[-(max_messages - 1):]
+async def commit_turn(key: str, conv: Conversation, prompt: Prompt, text: str, reply: str):
+    compact_to = conv.offset + prompt.dropped if prompt.dropped else 0
+    await store_call(_commit, key, compact_to, prompt.summary, [
+        {"role": "user", "content": text},
+        {"role": "assistant", "content": reply},
+    ])
+
+async def append_greeting(key: str, greeting: str):
+    await store_call(conversations.append, key, [{"role": "assistant", "content": greeting}])
 
 # ================= GREETINGS =================
 FIRST_GREETING = (
@@ -98,45 +185,25 @@ def returning_greeting(memory: dict) -> str:
         return f"Hi {name} — good to see you again. We can continue planning your wedding whenever you’re ready."
     return "Hi — good to see you again. We can continue planning your wedding whenever you’re ready."
 
-# ================= MODEL =================
-class Message(BaseModel):
-    text: Optional[str] = None
-
-# ================= ROUTES =================
-@app.get("/")
-def root():
-    return {"status": "ok"}
-
-@app.post("/chat")
-def chat(msg: Message, request: Request):
-    try:
-        token = get_token(request)
-        page = get_page(request)
-        sid = get_session_id(request)
-
-        memory = load_memory(token)
-        conv = get_conversation(token, page, sid, memory)
-
-        if not msg.text or not msg.text.strip():
-            greeting = returning_greeting(memory) if has_any_memory(memory) else FIRST_GREETING
-            conv.append({"role": "assistant", "content": greeting})
-            trim(conv)
-            return {"reply": greeting}
-
-        text = msg.text.strip()
-        conv.append({"role": "user", "content": text})
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=conv
-        )
-
-        reply = response.choices[0].message.content.strip()
-        conv.append({"role": "assistant", "content": reply})
-        trim(conv)
-
-        # ===== MEMORY EXTRACTION =====
-        memory_prompt = f"""
+# ================= CONCURRENCY =================
+# Per-token locks serialize memory read-merge-write; per-conversation locks keep
+# turns of one token:page:sid in order. Identical in-flight requests (same
+# token, page, sid and text) share one upstream call and its result.
+token_locks = KeyedLocks("token")
+conversation_locks = KeyedLocks("conversation")
+inflight = InFlight()
+
+async def update_memory(token: str, facts: dict):
+    async with token_locks.hold(token):
+        with stage("merge"):
+            await memory_cache.update(token, facts)
+
+# ================= MEMORY EXTRACTION =================
+def memory_prompt(turns: List[Turn]) -> str:
+    conversation = "\n".join(
+        f"User said: {t.text}\nAssistant replied: {t.reply}" for t in turns
+    )
+    return f"""
 Extract any facts about the *user or their wedding*.
 Never treat the assistant’s name as user data.
 Do NOT extract names from labels like "Emily", "Assistant", or role names.
@@ -161,21 +228,310 @@ Return ONLY valid JSON in this format:
 }}
 
 Conversation:
-User said: {text}
-Assistant replied: {reply}
+{conversation}
 """
 
-        mem_resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": memory_prompt}],
-        )
-
+async def extract_memory(token: str, turns: List[Turn]):
+    # Turns arrive in order. Leading local turns are merged directly; from the
+    # first turn that needs the LLM on, the rest go into the same call so a
+    # later fact is never overwritten by an earlier turn's result.
+    for i, turn in enumerate(turns):
+        if turn.facts is None or not await merge_local(token, turn.facts):
+            await extract_with_llm(token, turns[i:])
+            return
+
+async def extract_with_llm(token: str, turns: List[Turn]):
+    async with llm_slots:
+        with stage("extraction"):
+            mem_resp = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "system", "content": memory_prompt(turns)}],
+                response_format={"type": "json_object"},
+            )
+    record_usage("extraction", mem_resp.usage)
+
+    with stage("parse"):
         extracted = json.loads(mem_resp.choices[0].message.content)
-        memory = merge(memory, extracted)
-        save_memory(token, memory)
+    await update_memory(token, extracted)
+
+extraction_queue = ExtractionQueue(
+    extract_memory,
+    workers=int(os.environ.get("EXTRACTION_WORKERS", "16")),
+    max_retries=int(os.environ.get("EXTRACTION_RETRIES", "2")),
+)
+
+# Local facts at or above this confidence are merged without an LLM call.
+LOCAL_EXTRACTION_CONFIDENCE = float(os.environ.get("LOCAL_EXTRACTION_CONFIDENCE", "0.8"))
+
+def overwrites(stored: dict, facts: dict) -> bool:
+    for section, values in facts.items():
+        current = stored.get(section) or {}
+        for key, value in values.items():
+            if current.get(key) not in (None, "", []) and current.get(key) != value:
+                return True
+    return False
+
+async def merge_local(token: str, facts: dict) -> bool:
+    # Local facts only fill empty fields; changing a stored value needs the LLM.
+    async with token_locks.hold(token):
+        if overwrites(await memory_cache.get(token), facts):
+            return False
+        with stage("merge"):
+            await memory_cache.update(token, facts)
+        return True
+
+async def route_extraction(token: str, text: str, reply: str):
+    local = extract_facts(text)
+    if not local.plausible:
+        EXTRACTION_ROUTES.inc(route="skip")
+    elif local.needs_llm(LOCAL_EXTRACTION_CONFIDENCE):
+        EXTRACTION_ROUTES.inc(route="llm")
+        extraction_queue.submit(token, text, reply)
+    elif extraction_queue.busy(token):
+        # An earlier turn is still queued for the LLM; merge after it, not before.
+        EXTRACTION_ROUTES.inc(route="local_queued")
+        extraction_queue.submit(token, text, reply, facts=local.facts)
+    elif await merge_local(token, local.facts):
+        EXTRACTION_ROUTES.inc(route="local")
+    else:
+        EXTRACTION_ROUTES.inc(route="llm")
+        extraction_queue.submit(token, text, reply)
+
+# ================= LIFECYCLE =================
+background_tasks: List[asyncio.Task] = []
+
+@app.on_event("startup")
+async def startup():
+    extraction_queue.start()
+    background_tasks.append(asyncio.create_task(memory_cache.run_flusher(MEMORY_FLUSH_SECONDS)))
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Drain extraction first so its memory updates make the final flush.
+    await extraction_queue.stop()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await memory_cache.flush()
+    await supabase.aclose()
+    await client.close()
+
+# ================= STREAMING =================
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+async def greet(token: str, key: str, trace: Trace) -> str:
+    with stage("load_memory", trace):
+        memory = await memory_cache.get(token)
+
+    async with conversation_locks.hold(key):
+        await get_conversation(key)
+        greeting = returning_greeting(memory) if has_any_memory(memory) else FIRST_GREETING
+        await append_greeting(key, greeting)
+    return greeting
+
+async def answer(token: str, page: str, key: str, text: str, trace: Trace) -> str:
+    async with conversation_locks.hold(key):
+        with stage("load_memory", trace):
+            memory = await memory_cache.get(token)
+        conv = await get_conversation(key)
+        with stage("prompt", trace):
+            prompt = prompt_builder.build(page, memory, conv.summary, conv.turns, text)
+
+        async with llm_slots:
+            with stage("reply", trace):
+                response = await client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=prompt.messages
+                )
+        record_usage("reply", response.usage)
+
+        reply = response.choices[0].message.content.strip()
+        await commit_turn(key, conv, prompt, text, reply)
+        # Still under the lock, so this turn's facts are routed before the next turn's.
+        await route_extraction(token, text, reply)
+    return reply
+
+async def stream_shared(shared: asyncio.Future, trace: Trace):
+    # A duplicate of a stream already in flight: replay the leader's final reply.
+    try:
+        reply = await asyncio.shield(shared)
+    except Exception:
+        trace.finish("error")
+        yield sse("error", {"reply": "Backend error"})
+        return
+
+    trace.finish("coalesced")
+    yield sse("delta", {"text": reply})
+    yield sse("done", {"reply": reply})
+
+async def produce_stream(token: str, page: str, key: str, text: str, trace: Trace, events: asyncio.Queue) -> str:
+    # Runs as its own task (see InFlight), so the turn is committed and shared
+    # with duplicates even if the client that started it disconnects.
+    status = "error"
+    try:
+        async with conversation_locks.hold(key):
+            with stage("load_memory", trace):
+                memory = await memory_cache.get(token)
+            conv = await get_conversation(key)
+            with stage("prompt", trace):
+                prompt = prompt_builder.build(page, memory, conv.summary, conv.turns, text)
+
+            parts = []
+            async with llm_slots:
+                with stage("reply", trace):
+                    stream = await client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=prompt.messages,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                    )
+                    async for chunk in stream:
+                        if chunk.usage is not None:
+                            record_usage("reply", chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if not parts:
+                                trace.first_token()
+                            parts.append(delta)
+                            events.put_nowait(sse("delta", {"text": delta}))
+
+            reply = "".join(parts).strip()
+            await commit_turn(key, conv, prompt, text, reply)
+            await route_extraction(token, text, reply)
+
+        events.put_nowait(sse("done", {"reply": reply, "prompt_tokens": prompt.tokens}))
+        status = "ok"
+        return reply
+
+    except Exception as e:
+        print("CHAT STREAM ERROR:", e)
+        events.put_nowait(sse("error", {"reply": "Backend error"}))
+        raise
 
+    finally:
+        events.put_nowait(None)
+        trace.finish(status)
+
+async def relay(events: asyncio.Queue, trace: Trace):
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                return
+            yield event
+    finally:
+        # No-op once the producer has finished; otherwise the client left early.
+        trace.finish("disconnected")
+
+# ================= MODEL =================
+class Message(BaseModel):
+    text: Optional[str] = None
+
+# ================= ROUTES =================
+@app.get("/")
+def root():
+    return {"status": "ok"}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    sessions = await store_call(conversations.stats)
+    extra = (
+        stats_family("emily_extraction", extraction_queue.stats(),
+                     counters=["submitted", "coalesced", "calls", "processed", "retried", "rejected", "dropped"])
+        + stats_family("emily_memory_cache", memory_cache.stats(),
+                       counters=["hits", "misses", "evictions", "updates", "unchanged_updates",
+                                 "flushes", "flushed_rows", "flush_errors"])
+        + stats_family("emily_sessions", sessions, counters=["evictions", "spilled", "rehydrated"])
+        + stats_family("emily_prompt", prompt_builder.stats(), counters=["turns", "folded_turns", "truncated_messages"])
+        + stats_family("emily_token_locks", token_locks.stats(), counters=["acquired", "queued"])
+        + stats_family("emily_conversation_locks", conversation_locks.stats(), counters=["acquired", "queued"])
+        + stats_family("emily_requests_inflight", inflight.stats(), counters=["leaders", "coalesced"])
+    )
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/extraction")
+async def extraction_stats():
+    return extraction_queue.stats()
+
+@app.get("/stats/memory")
+async def memory_stats():
+    return memory_cache.stats()
+
+@app.get("/stats/sessions")
+async def session_stats():
+    return await store_call(conversations.stats)
+
+@app.get("/stats/prompt")
+async def prompt_stats():
+    return prompt_builder.stats()
+
+@app.get("/stats/concurrency")
+async def concurrency_stats():
+    return {
+        "token_locks": token_locks.stats(),
+        "conversation_locks": conversation_locks.stats(),
+        "inflight": inflight.stats(),
+    }
+
+@app.post("/chat")
+async def chat(msg: Message, request: Request):
+    trace = Trace("chat", SLOW_REQUEST_MS)
+    try:
+        token = get_token(request)
+        page = get_page(request)
+        sid = get_session_id(request)
+
+        key = conversation_key(token, page, sid)
+        text = (msg.text or "").strip()
+        request_id = request_key(token, page, sid, text)
+
+        if not text:
+            greeting, shared = await inflight.run(request_id, lambda: greet(token, key, trace))
+            trace.finish("coalesced" if shared else "greeting")
+            return {"reply": greeting}
+
+        reply, shared = await inflight.run(request_id, lambda: answer(token, page, key, text, trace))
+
+        trace.finish("coalesced" if shared else "ok")
         return {"reply": reply}
 
     except Exception as e:
         print("CHAT ERROR:", e)
+        trace.finish("error")
+        return JSONResponse(status_code=500, content={"reply": "Backend error"})
+
+@app.post("/chat/stream")
+async def chat_stream(msg: Message, request: Request):
+    trace = Trace("chat_stream", SLOW_REQUEST_MS)
+    try:
+        token = get_token(request)
+        page = get_page(request)
+        sid = get_session_id(request)
+
+        key = conversation_key(token, page, sid)
+        text = (msg.text or "").strip()
+        request_id = request_key(token, page, sid, text)
+
+        if not text:
+            greeting, shared = await inflight.run(request_id, lambda: greet(token, key, trace))
+            trace.finish("coalesced" if shared else "greeting")
+            events = iter([sse("delta", {"text": greeting}), sse("done", {"reply": greeting})])
+            return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+        events = asyncio.Queue()
+        work, shared = inflight.start(request_id, lambda: produce_stream(token, page, key, text, trace, events))
+        body = stream_shared(work, trace) if shared else relay(events, trace)
+        return StreamingResponse(body, media_type="text/event-stream", headers=SSE_HEADERS)
+
+    except Exception as e:
+        print("CHAT ERROR:", e)
+        trace.finish("error")
         return JSONResponse(status_code=500, content={"reply": "Backend error"})
@@ -0,0 +1,403 @@
+import json
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Per-turn overhead of a (role, content) tuple plus its list slot.
+TURN_OVERHEAD = sys.getsizeof(("user", "")) + 8
+
+
+class Conversation(NamedTuple):
+    summary: str
+    turns: List[Tuple[str, str]]
+    # Number of turns ever dropped from the front; turns[i] is turn offset + i.
+    offset: int = 0
+
+
+class ConversationBackend(ABC):
+    """Storage for conversations keyed by `token:page:sid`.
+
+    `append()` and `compact()` must be atomic per key. `compact()` takes an
+    absolute turn index rather than a count so that two workers compacting
+    the same snapshot drop the same turns once, not twice. A networked store
+    (Redis, Postgres) implements the same five methods.
+
+    `blocking` tells the server whether calls may wait on I/O or locks and
+    should run off the event loop.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Conversation]:
+        ...
+
+    @abstractmethod
+    def create(self, key: str) -> Conversation:
+        ...
+
+    @abstractmethod
+    def append(self, key: str, messages: List[dict]):
+        ...
+
+    @abstractmethod
+    def compact(self, key: str, upto: int, summary: str):
+        """Drop turns with absolute index < `upto` and store `summary` in their place."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        ...
+
+
+class Session:
+    __slots__ = ("summary", "turns", "offset", "last_used", "size")
+
+    def __init__(self, summary: str = "", turns: Optional[List[Tuple[str, str]]] = None, offset: int = 0):
+        self.summary = summary
+        self.turns: List[Tuple[str, str]] = turns or []
+        self.offset = offset
+        self.last_used = time.monotonic()
+        self.size = sys.getsizeof(summary) + sum(turn_size(t) for t in self.turns)
+
+
+def turn_size(turn: Tuple[str, str]) -> int:
+    return TURN_OVERHEAD + sys.getsizeof(turn[1])
+
+
+class SpillStore:
+    """SQLite file holding sessions evicted from memory, keyed like the store."""
+
+    def __init__(self, path: str, ttl: float):
+        self.ttl = ttl
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def put(self, key: str, session: Session):
+        data = json.dumps(
+            {"summary": session.summary, "turns": session.turns, "offset": session.offset},
+            ensure_ascii=False,
+        )
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (key, data, updated) VALUES (?, ?, ?)",
+                (key, data, time.time()),
+            )
+            self._writes += 1
+            if self._writes % 500 == 0:
+                self._db.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - self.ttl,))
+            self._db.commit()
+
+    def take(self, key: str) -> Optional[Session]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM sessions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            self._db.commit()
+
+        data = json.loads(row[0])
+        return Session(data.get("summary", ""), [tuple(t) for t in data["turns"]], data.get("offset", 0))
+
+
+class ConversationStore(ConversationBackend):
+    """In-process backend; only correct with a single uvicorn worker.
+
+    Sessions are kept in LRU order and evicted once there are more than
+    `max_entries` or one has been idle for `idle_ttl` seconds. When a spill
+    path is configured, evicted sessions are written to SQLite and
+    rehydrated on their next access instead of being lost.
+
+    Each session stores only (role, content) tuples and the rolling summary
+    of turns that no longer fit the prompt budget; prompt assembly lives in
+    prompt.py. `max_turns` is a hard safety cap, normal trimming happens
+    through `compact()`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_turns: int = 500,
+        idle_ttl: float = 3600.0,
+        spill_path: Optional[str] = None,
+        spill_ttl: float = 7 * 24 * 3600.0,
+    ):
+        self.max_entries = max_entries
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.spill = SpillStore(spill_path, spill_ttl) if spill_path else None
+        # Eviction and rehydration hit the spill file, so keep calls off the event loop.
+        self.blocking = self.spill is not None
+
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.evictions = 0
+        self.spilled = 0
+        self.rehydrated = 0
+
+    def _snapshot(self, session: Session) -> Conversation:
+        return Conversation(session.summary, list(session.turns), session.offset)
+
+    def _evict(self, now: float):
+        victims = []
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_entries and now - session.last_used <= self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self._bytes -= session.size
+            self.evictions += 1
+            victims.append((key, session))
+        return victims
+
+    def _spill(self, victims):
+        if self.spill is None:
+            return
+        for key, session in victims:
+            try:
+                self.spill.put(key, session)
+                self.spilled += 1
+            except Exception as e:
+                print("SESSION SPILL ERROR:", e)
+
+    def _touch(self, key: str) -> Optional[Session]:
+        session = self._sessions.get(key)
+        if session is not None:
+            session.last_used = time.monotonic()
+            self._sessions.move_to_end(key)
+        return session
+
+    def _add(self, key: str, session: Session):
+        self._sessions[key] = session
+        self._bytes += session.size
+        self._spill(self._evict(time.monotonic()))
+
+    def get(self, key: str) -> Optional[Conversation]:
+        with self._lock:
+            session = self._touch(key)
+            if session is not None:
+                return self._snapshot(session)
+
+        if self.spill is None:
+            return None
+        session = self.spill.take(key)
+        if session is None:
+            return None
+
+        with self._lock:
+            current = self._touch(key)
+            if current is not None:
+                return self._snapshot(current)
+            self.rehydrated += 1
+            self._add(key, session)
+            return self._snapshot(session)
+
+    def create(self, key: str) -> Conversation:
+        with self._lock:
+            session = self._touch(key)
+            if session is None:
+                session = Session()
+                self._add(key, session)
+            return self._snapshot(session)
+
+    def append(self, key: str, messages: List[dict]):
+        with self._lock:
+            session = self._touch(key)
+            if session is None:
+                session = Session()
+                self._add(key, session)
+
+            for m in messages:
+                turn = (m["role"], m["content"])
+                session.turns.append(turn)
+                session.size += turn_size(turn)
+                self._bytes += turn_size(turn)
+
+            self._drop(session, len(session.turns) - self.max_turns)
+
+    def compact(self, key: str, upto: int, summary: str):
+        with self._lock:
+            session = self._touch(key)
+            if session is None or upto <= session.offset:
+                return
+
+            self._drop(session, upto - session.offset)
+            delta = sys.getsizeof(summary) - sys.getsizeof(session.summary)
+            session.summary = summary
+            session.size += delta
+            self._bytes += delta
+
+    def _drop(self, session: Session, count: int):
+        if count <= 0:
+            return
+        for turn in session.turns[:count]:
+            session.size -= turn_size(turn)
+            self._bytes -= turn_size(turn)
+        del session.turns[:count]
+        session.offset += count
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._spill(self._evict(time.monotonic()))
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "spilled": self.spilled,
+                "rehydrated": self.rehydrated,
+            }
+
+
+class SQLiteConversationStore(ConversationBackend):
+    """Conversation store shared by every worker process on one machine.
+
+    Uses a WAL-mode SQLite file so readers never block the single writer,
+    and BEGIN IMMEDIATE transactions so each append/compact is atomic per
+    key across processes. Turns are stored with their absolute index, which
+    makes compaction idempotent. Sessions idle for `idle_ttl` are pruned
+    every few hundred writes.
+    """
+
+    blocking = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        key TEXT PRIMARY KEY,
+        summary TEXT NOT NULL DEFAULT '',
+        offset INTEGER NOT NULL DEFAULT 0,
+        updated REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS turns (
+        key TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        PRIMARY KEY (key, seq)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_turns: int = 500,
+        idle_ttl: float = 7 * 24 * 3600.0,
+        busy_timeout: float = 5.0,
+    ):
+        self.path = path
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._writes = 0
+
+        self.evictions = 0
+
+        db = self._db()
+        db.executescript(self.SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Autocommit mode; transactions are opened explicitly below.
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self, fn):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return result
+
+    def _write(self, fn):
+        result = self._transaction(fn)
+        self._writes += 1
+        if self._writes % 500 == 0:
+            self.evictions += self._transaction(self._prune)
+        return result
+
+    def _prune(self, db) -> int:
+        cutoff = time.time() - self.idle_ttl
+        db.execute("DELETE FROM turns WHERE key IN (SELECT key FROM sessions WHERE updated < ?)", (cutoff,))
+        return db.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,)).rowcount
+
+    def get(self, key: str) -> Optional[Conversation]:
+        db = self._db()
+        # A read transaction gives a consistent snapshot of both tables.
+        db.execute("BEGIN")
+        try:
+            row = db.execute("SELECT summary, offset FROM sessions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            turns = db.execute("SELECT role, content FROM turns WHERE key = ? ORDER BY seq", (key,)).fetchall()
+        finally:
+            db.execute("COMMIT")
+        return Conversation(row[0], [tuple(t) for t in turns], row[1])
+
+    def create(self, key: str) -> Conversation:
+        self._write(lambda db: db.execute(
+            "INSERT OR IGNORE INTO sessions (key, updated) VALUES (?, ?)", (key, time.time())
+        ))
+        return self.get(key) or Conversation("", [], 0)
+
+    def append(self, key: str, messages: List[dict]):
+        def append(db):
+            db.execute("INSERT OR IGNORE INTO sessions (key, updated) VALUES (?, ?)", (key, time.time()))
+            (offset,) = db.execute("SELECT offset FROM sessions WHERE key = ?", (key,)).fetchone()
+            (last,) = db.execute("SELECT MAX(seq) FROM turns WHERE key = ?", (key,)).fetchone()
+            seq = offset if last is None else last + 1
+
+            db.executemany(
+                "INSERT INTO turns (key, seq, role, content) VALUES (?, ?, ?, ?)",
+                [(key, seq + i, m["role"], m["content"]) for i, m in enumerate(messages)],
+            )
+            next_seq = seq + len(messages)
+
+            if next_seq - offset > self.max_turns:
+                offset = next_seq - self.max_turns
+                db.execute("DELETE FROM turns WHERE key = ? AND seq < ?", (key, offset))
+            db.execute("UPDATE sessions SET offset = ?, updated = ? WHERE key = ?", (offset, time.time(), key))
+
+        self._write(append)
+
+    def compact(self, key: str, upto: int, summary: str):
+        def compact(db):
+            changed = db.execute(
+                "UPDATE sessions SET summary = ?, offset = ?, updated = ? WHERE key = ? AND offset < ?",
+                (summary, upto, time.time(), key, upto),
+            ).rowcount
+            if changed:
+                db.execute("DELETE FROM turns WHERE key = ? AND seq < ?", (key, upto))
+
+        self._write(compact)
+
+    def stats(self) -> Dict[str, int]:
+        db = self._db()
+        (sessions,) = db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        (turns,) = db.execute("SELECT COUNT(*) FROM turns").fetchone()
+        (pages,) = db.execute("PRAGMA page_count").fetchone()
+        (page_size,) = db.execute("PRAGMA page_size").fetchone()
+        return {
+            "sessions": sessions,
+            "turns": turns,
+            "bytes": pages * page_size,
+            "evictions": self.evictions,
+        }
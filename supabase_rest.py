@@ -0,0 +1,46 @@
+from typing import List
+
+import httpx
+
+
+class SupabaseREST:
+    """Minimal async client for Supabase's PostgREST API over a pooled httpx client.
+
+    Only covers what the server needs (select by eq/in, upsert), which
+    keeps database calls off the threadpool that supabase-py would need.
+    """
+
+    def __init__(self, url: str, key: str, max_connections: int = 50, timeout: float = 10.0):
+        self._http = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers={"apikey": key, "Authorization": f"Bearer {key}"},
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=timeout,
+        )
+
+    async def select(self, table: str, columns: str, **eq) -> List[dict]:
+        params = {"select": columns}
+        params.update({column: f"eq.{value}" for column, value in eq.items()})
+        res = await self._http.get(f"/{table}", params=params)
+        res.raise_for_status()
+        return res.json()
+
+    async def select_in(self, table: str, columns: str, column: str, values: List[str]) -> List[dict]:
+        quoted = ",".join('"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values)
+        res = await self._http.get(f"/{table}", params={"select": columns, column: f"in.({quoted})"})
+        res.raise_for_status()
+        return res.json()
+
+    async def upsert(self, table: str, rows: List[dict]):
+        res = await self._http.post(
+            f"/{table}",
+            json=rows,
+            headers={"Prefer": "resolution=merge-duplicates,return=minimal"},
+        )
+        res.raise_for_status()
+
+    async def aclose(self):
+        await self._http.aclose()
@@ -0,0 +1,79 @@
+import pytest
+
+from facts import extract_facts
+
+THRESHOLD = 0.8
+
+
+def confident(text: str) -> dict:
+    """Fields the server would merge without asking the LLM."""
+    result = extract_facts(text)
+    return {key: value for section in result.facts.values() for key, value in section.items()
+            if result.fields[key] >= THRESHOLD}
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Nationalities, religions and adjectives are not names.
+    ("I am Italian.", {}),
+    ("I'm Catholic.", {}),
+    ("This is Amazing", {}),
+    ("Hi, I'm Italian.", {}),
+    # A bare "in <city>" is not the wedding city.
+    ("We're in Paris this weekend", {}),
+    ("We love Italy. We're getting married in Rome.", {"city": "Rome"}),
+    ("We're getting married in Paris", {"city": "Paris"}),
+    # Introductions and explicit statements still resolve locally.
+    ("Hi, I'm Jane.", {"name": "Jane"}),
+    ("Hello, this is Anna", {"name": "Anna"}),
+    ("Hi, I'm Jane and my partner is Tom", {"name": "Jane", "partner": "Tom"}),
+    ("My name is Anna", {"name": "Anna"}),
+    ("my name is anna", {"name": "Anna"}),
+    ("My name is Anna and our budget is flexible", {"name": "Anna"}),
+    ("My fiancé is Marco.", {"partner": "Marco"}),
+    ("The date is June 12, 2026.", {"date": "2026-06-12"}),
+    ("We expect around 120 guests.", {"guests_count": 120}),
+    # "<n> people" needs guest-list context; a second number makes the count uncertain.
+    ("We had 300 people at my sister's wedding", {}),
+    ("We have 3 people on our team", {}),
+    ("10 guests maybe 20", {}),
+    ("We're inviting about 80 people.", {"guests_count": 80}),
+    # Venue names are anchored on the keyword and split on and/&/commas.
+    ("We're at The Manor House", {"venue_shortlist": ["The Manor House"]}),
+    ("we toured Villa Medici And Castle Howard", {"venue_shortlist": ["Villa Medici", "Castle Howard"]}),
+    ("We're looking at Villa Medici and Castello di Vincigliata.",
+     {"venue_shortlist": ["Villa Medici", "Castello di Vincigliata"]}),
+    # Unit words are not million/thousand suffixes; "spend" alone is not money.
+    ("Our budget is 5 months of savings", {}),
+    ("we spend 10 minutes a day planning", {}),
+    ("We want to spend about 20k", {}),
+    ("Our budget is 30-40k euros.", {"budget_range": "30,000-40,000 EUR"}),
+    ("Our budget is 1.5m euros", {"budget_range": "1,500,000 EUR"}),
+])
+def test_confident_fields(text, expected):
+    assert confident(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "I'm Anna.",
+    "This is Amazing",
+    "We're in Paris this weekend",
+])
+def test_ambiguous_is_never_merged_locally(text):
+    result = extract_facts(text)
+    assert not result.plausible or result.needs_llm(THRESHOLD)
+
+
+@pytest.mark.parametrize("text", [
+    "Marco", "150", "about 120", "June", "probably Tuscany",
+    # Statements no pattern resolves must not be skipped.
+    "small ceremony with just family in Tuscany",
+    "Our wedding will be small, around fifty",
+    "I'm Jane and my partner is Tom",
+])
+def test_short_answers_go_to_the_llm(text):
+    assert extract_facts(text).needs_llm(THRESHOLD)
+
+
+@pytest.mark.parametrize("text", ["thanks!", "ok sounds good", "hmm", "not sure", "what should I do first?"])
+def test_small_talk_is_skipped(text):
+    assert not extract_facts(text).plausible
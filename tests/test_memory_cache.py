@@ -0,0 +1,65 @@
+import asyncio
+import copy
+
+from memory_cache import MemoryCache
+
+
+def merge(a, b):
+    for k, v in b.items():
+        if isinstance(v, dict):
+            a[k] = merge(a.get(k, {}), v)
+        elif v not in (None, "", []):
+            a[k] = v
+    return a
+
+
+class FakeTable:
+    """Stands in for emily_memories: saves merge the delta over the current row."""
+
+    def __init__(self, rows=None, delay=0.0):
+        self.rows = rows or {}
+        self.delay = delay
+
+    async def load(self, token):
+        return copy.deepcopy(self.rows.get(token, {}))
+
+    async def save(self, batch):
+        await asyncio.sleep(self.delay)
+        saved = {}
+        for token, changes in batch:
+            self.rows[token] = merge(copy.deepcopy(self.rows.get(token, {})), changes)
+            saved[token] = copy.deepcopy(self.rows[token])
+        return saved
+
+
+def test_flush_does_not_overwrite_fields_another_worker_saved():
+    async def scenario():
+        table = FakeTable({"t": {"wedding": {"city": "Rome"}}})
+        a = MemoryCache(table.load, table.save, merge)
+        b = MemoryCache(table.load, table.save, merge)
+        await a.get("t")
+        await b.update("t", {"wedding": {"city": "Florence"}})
+        await b.flush()
+        await a.update("t", {"profile": {"name": "Anna"}})
+        await a.flush()
+        return table.rows["t"], await a.get("t")
+
+    row, cached = asyncio.run(scenario())
+    assert row == {"wedding": {"city": "Florence"}, "profile": {"name": "Anna"}}
+    assert cached == row
+
+
+def test_evicted_entry_stays_readable_while_its_flush_runs():
+    async def scenario():
+        table = FakeTable(delay=0.05)
+        cache = MemoryCache(table.load, table.save, merge, max_entries=1)
+        await cache.update("a", {"name": "Anna"})
+        await cache.get("b")  # evicts "a" into the write-back buffer
+        flush = asyncio.create_task(cache.flush())
+        await asyncio.sleep(0.01)
+        during = await cache.get("a")
+        await flush
+        return during, await cache.get("a")
+
+    during, after = asyncio.run(scenario())
+    assert during == after == {"name": "Anna"}
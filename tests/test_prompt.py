@@ -0,0 +1,50 @@
+from prompt import PromptBuilder
+
+
+def builder(budget: int, summary_budget: int) -> PromptBuilder:
+    b = PromptBuilder("You are Emily. " * 20, budget=budget, summary_budget=summary_budget)
+    b._encoding = None  # chars/4 estimate, no tokenizer download
+    return b
+
+
+def converse(b: PromptBuilder, messages):
+    turns, summary, prompts = [("assistant", "Hi — I'm Emily.")], "", []
+    for i, text in enumerate(messages):
+        prompt = b.build("Entry", {}, summary, turns, text)
+        prompts.append(prompt)
+        turns, summary = turns[prompt.dropped:], prompt.summary
+        turns += [("user", text), ("assistant", f"Noted ({i}). Shall we look at venues?")]
+    return prompts
+
+
+MESSAGES = [
+    "My name is Anna and my fiancé is Marco.",
+    "We're getting married in Italy.",
+    "How do I pick a photographer for a rustic barn look?",
+    "We expect around 120 guests.",
+    "Our budget is 30-40k euros.",
+] * 3
+
+
+def test_history_keeps_whole_exchanges_within_budget():
+    b = builder(budget=500, summary_budget=60)
+    for prompt in converse(b, MESSAGES):
+        assert prompt.tokens <= 500
+        history = [m for m in prompt.messages if m["role"] != "system"]
+        assert history[-1]["role"] == "user"
+        assert history[0]["role"] == "user" or history[0]["content"].startswith("Hi")
+
+
+def test_summary_keeps_facts_after_old_lines_are_compressed():
+    b = builder(budget=500, summary_budget=60)
+    summary = converse(b, MESSAGES)[-1].summary
+    assert "name=Anna" in summary
+    assert "country=Italy" in summary
+    assert b.count(summary) <= 60
+
+
+def test_oversized_user_message_is_truncated_to_budget():
+    b = builder(budget=500, summary_budget=60)
+    prompt = b.build("Entry", {}, "", [], "word " * 5000)
+    assert prompt.tokens <= 500
+    assert b.stats()["truncated_messages"] == 1